@@ -0,0 +1,303 @@
+"""Offline load test: replays synthetic traffic through the bot's handlers without connecting to Discord.
+
+Lightweight stand-ins for Message, Member, Guild, TextChannel and interactions answer every Discord
+request after a simulated HTTP latency and count it. The script drives on_message at a fixed message
+rate, mixed with admin give/take/set commands and leaderboard/naughtylist requests, then reports:
+  * handler latency (p50/p95/p99/max) per handler; for on_message, from the event until its scan verdict
+  * event-loop lag, sampled every 10 ms
+  * bytes written to disk (from /proc/self/io, Linux only)
+  * simulated Discord API calls, in total and per event
+
+Run from the repository root, for example:
+    python benchmarks/load_test.py --rate 200 --duration 10 --guilds 20 --users 500 --violation-ratio 0.05
+"""
+import argparse
+import asyncio
+import collections
+import os
+import random
+import sys
+import tempfile
+import time
+
+# The bot creates its data files in the working directory on import, so run in a scratch directory.
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.chdir(tempfile.mkdtemp(prefix="sc_load_"))
+import disnake  # noqa: E402
+import social_credit_bot as scb  # noqa: E402
+
+
+class FakeAPI:
+    """Counts simulated Discord requests and answers each one after a random latency."""
+
+    def __init__(self, latency_ms: float, jitter_ms: float):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.calls = collections.Counter()
+
+    async def call(self, kind: str):
+        self.calls[kind] += 1
+        await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+
+class FakeRole:
+    def __init__(self, role_id: int, name: str, default: bool = False):
+        self.id = role_id; self.name = name; self._default = default
+        self.mention = f"<@&{role_id}>"
+
+    def is_default(self): return self._default
+
+
+class FakeAsset:
+    url = "https://cdn.discordapp.com/embed/avatars/0.png"
+
+
+class FakeMember(disnake.Member):
+    """Passes the bot's isinstance(..., disnake.Member) checks without a gateway payload behind it."""
+
+    def __init__(self, guild, user_id: int, roles, api: FakeAPI):
+        self.guild = guild
+        self._communication_disabled_until = None
+        self._fake_id = user_id; self._fake_roles = list(roles); self._api = api
+        self._roles = disnake.utils.SnowflakeList(role.id for role in roles if not role.is_default())
+
+    id = property(lambda self: self._fake_id)
+    name = property(lambda self: f"citizen{self._fake_id}")
+    display_name = property(lambda self: f"Citizen {self._fake_id}")
+    mention = property(lambda self: f"<@{self._fake_id}>")
+    roles = property(lambda self: self._fake_roles)
+    display_avatar = FakeAsset()
+    bot = False
+
+    async def send(self, content=None, **kwargs): await self._api.call("dm")
+
+    async def edit(self, *, roles=None, reason=None):
+        await self._api.call("role_edit")
+        if roles is not None:
+            self._fake_roles = [self.guild.default_role, *roles]
+            self._roles = disnake.utils.SnowflakeList(role.id for role in roles)
+
+    async def timeout(self, *, until=None, duration=None, reason=None):
+        await self._api.call("timeout")
+        self._communication_disabled_until = until
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int, guild, api: FakeAPI):
+        self.id = channel_id; self.guild = guild; self.name = f"channel-{channel_id}"; self._api = api
+
+    async def send(self, content=None, **kwargs): await self._api.call("channel_send")
+
+    async def delete_messages(self, messages): await self._api.call("bulk_delete")
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int, user_count: int, cached_ratio: float, api: FakeAPI):
+        self.id = guild_id; self.name = f"Guild {guild_id}"; self.icon = None; self._api = api
+        self.default_role = FakeRole(guild_id, "@everyone", default=True)
+        self.roles = [self.default_role] + [FakeRole(guild_id * 100 + i, r[3]) for i, r in enumerate(scb.SOCIAL_RANKS, 1)]
+        self._roles_by_id = {role.id: role for role in self.roles}
+        self.channels = [FakeChannel(guild_id * 1000 + i, self, api) for i in range(3)]
+        self.all_members = {}
+        self._cache = {}
+        for i in range(user_count):
+            member = FakeMember(self, guild_id * 1_000_000 + i, [self.default_role], api)
+            self.all_members[member.id] = member
+            if random.random() < cached_ratio: self._cache[member.id] = member
+
+    def get_member(self, user_id: int): return self._cache.get(user_id)
+
+    def get_role(self, role_id: int): return self._roles_by_id.get(role_id)
+
+    async def query_members(self, *, user_ids, limit=None, cache=True):
+        await self._api.call("query_members")
+        found = [self.all_members[i] for i in user_ids if i in self.all_members]
+        if cache: self._cache.update((m.id, m) for m in found)
+        return found
+
+
+class FakeMessage:
+    _ids = iter(range(1, 10**12))
+
+    def __init__(self, author: FakeMember, channel: FakeChannel, content: str, api: FakeAPI):
+        self.id = next(self._ids); self.author = author; self.guild = author.guild
+        self.channel = channel; self.content = content; self._api = api
+        self.embeds = []; self.attachments = []
+
+    async def delete(self): await self._api.call("delete")
+
+
+class FakeResponse:
+    def __init__(self, api: FakeAPI): self._api = api; self._done = False
+    def is_done(self): return self._done
+    async def defer(self, **kwargs): self._done = True; await self._api.call("interaction_defer")
+    async def send_message(self, *args, **kwargs): self._done = True; await self._api.call("interaction_response")
+
+
+class FakeFollowup:
+    def __init__(self, api: FakeAPI): self._api = api
+    async def send(self, *args, **kwargs): await self._api.call("interaction_followup")
+
+
+class FakeInteraction:
+    def __init__(self, guild: FakeGuild, author: FakeMember, api: FakeAPI):
+        self.guild = guild; self.author = author
+        self.response = FakeResponse(api); self.followup = FakeFollowup(api)
+
+
+WORDS = "the party glorious harvest comrade tractor factory quota people five year plan river bridge".split()
+
+def make_content(violation: bool) -> str:
+    words = random.choices(WORDS, k=random.randint(3, 25))
+    if violation: words.insert(random.randrange(len(words) + 1), random.choice(scb.FORBIDDEN_WORDS))
+    return " ".join(words)
+
+
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values: return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def read_write_bytes() -> int:
+    try:
+        with open("/proc/self/io") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("wchar:"))
+    except (OSError, StopIteration):
+        return -1
+
+
+async def monitor_loop_lag(samples: list, interval: float = 0.01):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+async def run(args):
+    random.seed(args.seed)
+    api = FakeAPI(args.latency_ms, args.jitter_ms)
+    if args.backend == "sqlite": scb.store = scb.SqliteCreditStore(scb.SQLITE_DB_FILE)
+    guilds = [FakeGuild(g + 1, args.users, args.cached_ratio, api) for g in range(args.guilds)]
+    scb.store.start(); scb.notifier.start(); scb.scanner.start(); scb.credit_history.start(); scb.timeout_ledger.start()
+
+    latencies = collections.defaultdict(list)
+    events = collections.Counter()
+    tasks = []
+
+    # on_message only queues the message, so also wait for its scan to finish (verdict reached and any
+    # punishment handed to the violation burst collector) before counting it as handled.
+    scan_done = {} # message ID -> future
+    original_scan = scb.scanner._scan
+
+    async def tracked_scan(message):
+        try: await original_scan(message)
+        finally:
+            done = scan_done.pop(message.id, None)
+            if done and not done.done(): done.set_result(None)
+
+    scb.scanner._scan = tracked_scan
+
+    async def handle_message(message):
+        done = scan_done[message.id] = asyncio.get_running_loop().create_future()
+        await scb.on_message(message)
+        await done
+
+    async def timed(kind: str, coro):
+        started = time.perf_counter()
+        try: await coro
+        except Exception as e: print(f"{kind} raised {type(e).__name__}: {e}")
+        latencies[kind].append(time.perf_counter() - started)
+
+    def random_member(guild: FakeGuild) -> FakeMember:
+        return random.choice(list(guild.all_members.values()))
+
+    def spawn(kind: str, coro):
+        events[kind] += 1
+        tasks.append(asyncio.ensure_future(timed(kind, coro)))
+
+    lag_samples = []
+    lag_task = asyncio.ensure_future(monitor_loop_lag(lag_samples))
+    bytes_before = read_write_bytes()
+    started = time.perf_counter()
+
+    tick = 0.01
+    message_budget = admin_budget = leaderboard_budget = 0.0
+    while time.perf_counter() - started < args.duration:
+        message_budget += args.rate * tick
+        admin_budget += args.admin_rate * tick
+        leaderboard_budget += args.leaderboard_rate * tick
+        while message_budget >= 1:
+            message_budget -= 1
+            guild = random.choice(guilds)
+            message = FakeMessage(random_member(guild), random.choice(guild.channels), make_content(random.random() < args.violation_ratio), api)
+            spawn("on_message", handle_message(message))
+        while admin_budget >= 1:
+            admin_budget -= 1
+            guild = random.choice(guilds)
+            op = random.choice(["give", "take", "set"])
+            amount = random.randint(1, 3000)
+            spawn("admin_" + op, scb._admin_credit_operation(
+                FakeInteraction(guild, random_member(guild), api), random_member(guild),
+                -amount if op == "take" else amount, op != "set", "Load test", op))
+        while leaderboard_budget >= 1:
+            leaderboard_budget -= 1
+            guild = random.choice(guilds)
+            command = random.choice([scb.leaderboard, scb.naughty_list])
+            spawn(command.name, command.callback(FakeInteraction(guild, random_member(guild), api), top_n=10))
+        await asyncio.sleep(tick)
+    load_seconds = time.perf_counter() - started
+
+    await asyncio.gather(*tasks)
+    await scb.scanner.close(timeout=60)
+    # Let queued notifications, debounced role edits and the final snapshot finish so their cost is counted.
+    await asyncio.gather(*scb.role_sync._workers.values())
+    await scb.notifier.close(timeout=60)
+    await scb.credit_history.close()
+    await scb.timeout_ledger.close()
+    await scb.store.close()
+    drain_seconds = time.perf_counter() - started - load_seconds
+    lag_task.cancel()
+    bytes_written = read_write_bytes() - bytes_before if bytes_before >= 0 else -1
+
+    total_events = sum(events.values())
+    print(f"Load: {total_events} events in {load_seconds:.1f}s across {args.guilds} guild(s) x {args.users} user(s); "
+          f"drained in {drain_seconds:.1f}s; simulated latency {args.latency_ms}±{args.jitter_ms} ms; backend {args.backend}\n")
+    print(f"{'handler':<22}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for kind in sorted(latencies):
+        values = sorted(latencies[kind])
+        print(f"{kind:<22}{len(values):>8}" + "".join(f"{percentile(values, q) * 1000:>10.2f}" for q in (0.5, 0.95, 0.99)) + f"{values[-1] * 1000:>10.2f}")
+    lag = sorted(lag_samples)
+    print(f"\nEvent-loop lag: p50 {percentile(lag, 0.5) * 1000:.2f} ms, p99 {percentile(lag, 0.99) * 1000:.2f} ms, max {lag[-1] * 1000 if lag else 0:.2f} ms")
+    if bytes_written >= 0:
+        print(f"Bytes written: {bytes_written:,} ({bytes_written / max(total_events, 1):,.0f} per event)")
+    else:
+        print("Bytes written: unavailable (needs /proc/self/io)")
+    total_calls = sum(api.calls.values())
+    print(f"Simulated API calls: {total_calls} ({total_calls / max(total_events, 1):.2f} per event)")
+    for kind, count in api.calls.most_common():
+        print(f"  {kind:<22}{count:>8}")
+    print(f"Notifier: {scb.notifier.stats()}")
+    print(f"Role sync: {scb.role_sync.edits_applied} edit(s) applied, {scb.role_sync.edits_skipped} skipped")
+    print(f"Scanner: {scb.scanner.counters}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=100, help="messages per second")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of traffic")
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--users", type=int, default=200, help="members per guild")
+    parser.add_argument("--violation-ratio", type=float, default=0.05, help="share of messages containing a forbidden word")
+    parser.add_argument("--admin-rate", type=float, default=1, help="admin give/take/set commands per second")
+    parser.add_argument("--leaderboard-rate", type=float, default=0.5, help="leaderboard/naughtylist commands per second")
+    parser.add_argument("--latency-ms", type=float, default=80, help="simulated Discord API latency")
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--cached-ratio", type=float, default=0.9, help="share of members present in the gateway cache")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,48 @@
+import asyncio
+from array import array
+import bisect
+import collections
+import concurrent.futures
+import contextlib
+import csv
 import disnake
+import functools
 from disnake.ext import commands
+import io
 import json
+import operator
 import os
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 import re
+import unicodedata
 import datetime # For timeouts
+import hashlib
+import itertools
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+try: import fcntl
+except ImportError: fcntl = None # Not available on Windows; file locks are skipped there
 
 # --- Constants ---
-DATA_FILE = "social_credits.json"
+DATA_FILE = "social_credits.json" # Single-file layout of older versions; split into JSON_DATA_DIR on first start
 FORBIDDEN_STATS_FILE = "forbidden_word_stats.json"
 
 DEFAULT_CREDITS = 1000
 BOT_TOKEN = "YOUR_BOT_TOKEN_HERE" # IMPORTANT: Replace with your bot token!
 
-# Example forbidden pattern (adjust to your needs)
-# This example pattern looks for "badword" and its variations
-# b_chars = r"[bB8]"
-# a_chars = r"[aA@4]"
-# d_chars = r"[dD]"
-# w_chars = r"[wW]"
-# o_chars = r"[oO0]"
-# r_chars = r"[rR]"
-# FORBIDDEN_PATTERN_REGEX = re.compile(
-#     rf"\b{b_chars}{a_chars}{d_chars}\s*{w_chars}{o_chars}{r_chars}{d_chars}\b", # Example: "b4d w0rd"
-#     re.IGNORECASE | re.UNICODE
-# )
-# For now, let's use a simpler placeholder for demonstration. Replace with your actual pattern.
-FORBIDDEN_PATTERN_REGEX = re.compile(
-    r"\b(examplebadword1|examplebadword2)\b", # Replace with actual words/patterns
-    re.IGNORECASE | re.UNICODE
-)
+# Forbidden words/phrases checked on every server (adjust to your needs).
+# Admins can add server-specific words with /socialcredit admin forbid.
+# Matching ignores case, accents, zero-width characters, common homoglyphs, leetspeak and
+# repeated letters, so "examplebadword1" also catches e.g. "ЕxAmpleb4aaadw0rd1".
+FORBIDDEN_WORDS = [
+    "examplebadword1", # Replace with actual words/phrases
+    "examplebadword2",
+]
+FORBIDDEN_WORDS_FILE = "forbidden_words.json" # Per-server word lists
 FORBIDDEN_WORD_PENALTY = 1000 # Penalty for forbidden words
 
 # --- Embed Colors ---
@@ -40,60 +53,1963 @@ EMBED_COLOR_PARTY = 0xDAA520   # Gold (Party color)
 EMBED_COLOR_WARNING = 0xf1c40f # Orange
 EMBED_COLOR_SEVERE_WARNING = 0xc0392b # Dark Red
 
-# --- Ranks and their icons (credits, rank_name, icon, SERVER_ROLE_NAME) ---
-# Make sure roles with these names exist on your server!
-SOCIAL_RANKS = [
-    # (credits, display_name, icon, role_name_on_server)
-    (-float('inf'), "Social Outcast", "🚫", "Social Outcast"),
-    (0, "Suspicious Citizen", "❓", "Suspicious Citizen"),
-    (500, "Ordinary Citizen", "👤", "Ordinary Citizen"),
-    (1500, "Model Citizen", "🌟", "Model Citizen"),
-    (3000, "Pride of the Party", "🇨🇳", "Pride of the Party"), # Keep the flag for theme if you like
-    (5000, "Great Helmsman", "👑", "Great Helmsman")
-]
+# --- Ranks and their icons (credits, rank_name, icon, SERVER_ROLE_NAME) ---
+# Make sure roles with these names exist on your server!
+# This is the default ladder; admins can give a server its own with /socialcredit admin rankset.
+SOCIAL_RANKS = [
+    # (credits, display_name, icon, role_name_on_server)
+    (-float('inf'), "Social Outcast", "🚫", "Social Outcast"),
+    (0, "Suspicious Citizen", "❓", "Suspicious Citizen"),
+    (500, "Ordinary Citizen", "👤", "Ordinary Citizen"),
+    (1500, "Model Citizen", "🌟", "Model Citizen"),
+    (3000, "Pride of the Party", "🇨🇳", "Pride of the Party"), # Keep the flag for theme if you like
+    (5000, "Great Helmsman", "👑", "Great Helmsman")
+]
+RANK_TABLES_FILE = "rank_tables.json" # Per-server rank ladders
+RETIRED_RANK_ROLES_FILE = "retired_rank_roles.json" # Role names dropped from a ladder, removed from members on the next resync
+
+# --- Storage Settings ---
+STORAGE_BACKEND = "json" # "json" (default) or "sqlite"
+SQLITE_DB_FILE = "social_credits.db"
+JSON_DATA_DIR = "social_credit_data" # JSON backend: a snapshot and an append-only journal of every change, per server
+JSON_CACHE_MAX_GUILDS = 500 # Servers whose data is kept loaded; the least recently used ones are evicted beyond this...
+JSON_CACHE_MAX_ENTRIES = 1_000_000 # ...or beyond this many loaded users (credit and forbidden-word rows)
+JOURNAL_FILE = "credit_journal.jsonl" # Journal of the single-file layout, replayed once when it is split
+JOURNAL_ARCHIVE_DIR = "journal_archive" # Compacted journal segments are kept here as an audit trail. None deletes them.
+JOURNAL_FSYNC_INTERVAL_SECONDS = 1 # Journal appends are fsynced at least this often
+SNAPSHOT_INTERVAL_SECONDS = 300 # Changed servers' snapshots are rewritten (and journals compacted) at least this often
+SNAPSHOT_JOURNAL_THRESHOLD = 5000 # ...or as soon as one server has this many journal records pending
+SNAPSHOT_SEQ_KEY = "_journal_seq" # Reserved key in the JSON snapshots
+RANK_INDEX_BLOCK = 512 # Keys per block of the in-memory ranking index (JSON backend)
+SQLITE_BUSY_TIMEOUT_SECONDS = 10 # How long a write waits for another process's transaction to finish
+SQLITE_RANK_INDEX_MAX_GUILDS = 64 # Servers whose in-memory credit ranking (for /socialcredit check) is kept
+
+# --- Sharding ---
+# The gateway can be split over several processes, each owning some of the bot's shards (Discord puts
+# a server on shard (guild_id >> 22) % SHARD_COUNT). Start each process with its shards, e.g.
+#   python social_credit_bot.py --shard-count 4 --shard-ids 0,1
+#   python social_credit_bot.py --shard-count 4 --shard-ids 2,3
+# or start them all at once with: python social_credit_bot.py --launch-shards 4 --processes 2
+# Shard processes always share the SQLite database, whatever STORAGE_BACKEND says.
+SHARD_COUNT = None # Total number of shards. None runs one unsharded process.
+SHARD_IDS = None # Shards run by this process, e.g. [0, 1]. None runs all SHARD_COUNT shards here.
+SHARD_LAUNCH_DELAY_SECONDS = 5 # --launch-shards waits this long per shard before starting the next process (identify rate limit)
+
+def _cli_option(flag: str) -> Optional[str]:
+    return sys.argv[sys.argv.index(flag) + 1] if flag in sys.argv[:-1] else None
+
+if _cli_option("--shard-count"): SHARD_COUNT = int(_cli_option("--shard-count"))
+if _cli_option("--shard-ids"): SHARD_IDS = [int(shard_id) for shard_id in _cli_option("--shard-ids").split(",")]
+# Files only one process may write (decay and reconciliation state) get this suffix.
+PROCESS_FILE_SUFFIX = f"_shard{SHARD_IDS[0]}" if SHARD_IDS else ""
+
+def process_file(path: str) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}{PROCESS_FILE_SUFFIX}{ext}"
+
+# --- Metrics ---
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108 # Prometheus text endpoint at http://METRICS_HOST:METRICS_PORT/metrics. None disables it.
+if METRICS_PORT and SHARD_IDS: METRICS_PORT += SHARD_IDS[0] # One endpoint per shard process
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Fixed-bucket latency histogram. observe() is a bisect and three additions."""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0; self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value; self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation (inf if it is past the last bucket)."""
+        target = q * self.count; seen = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS + (float("inf"),), self.counts):
+            seen += bucket_count
+            if seen >= target: return bound
+        return float("inf")
+
+
+class Metrics:
+    """In-process counters and histograms, rendered in the Prometheus text format only when scraped."""
+
+    def __init__(self):
+        self.counters = {} # (name, labels) -> value
+        self.histograms = {} # (name, labels) -> Histogram
+        self.help = {}
+        self._collectors = [] # Callables returning [(name, labels, value)] gauges at scrape time
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def describe(self, name: str, text: str):
+        self.help[name] = text
+
+    def inc(self, name: str, amount: int = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        hist = self.histograms.get(key)
+        if hist is None: hist = self.histograms[key] = Histogram()
+        return hist
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels):
+        hist = self.histogram(name, **labels)
+        started = time.perf_counter()
+        try: yield
+        finally: hist.observe(time.perf_counter() - started)
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    @staticmethod
+    def _labels(labels, extra: str = "") -> str:
+        parts = [f'{k}="{v}"' for k, v in labels] + ([extra] if extra else [])
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> str:
+        lines = []; described = set()
+        def header(name: str, kind: str):
+            if name in described: return
+            described.add(name)
+            if name in self.help: lines.append(f"# HELP {name} {self.help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+        for (name, labels), value in sorted(self.counters.items()):
+            header(name, "counter")
+            lines.append(f"{name}{self._labels(labels)} {value}")
+        for (name, labels), hist in sorted(self.histograms.items(), key=lambda item: item[0]):
+            header(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS + ("+Inf",), hist.counts):
+                cumulative += bucket_count
+                le_label = f'le="{bound}"'
+                lines.append(f"{name}_bucket{self._labels(labels, le_label)} {cumulative}")
+            lines.append(f"{name}_sum{self._labels(labels)} {hist.sum}")
+            lines.append(f"{name}_count{self._labels(labels)} {hist.count}")
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                header(name, "gauge")
+                lines.append(f"{name}{self._labels(tuple(sorted(labels.items())))} {value}")
+        return "\n".join(lines) + "\n"
+
+    async def start_server(self, host: str, port: int):
+        if self._server: return
+        try:
+            self._server = await asyncio.start_server(self._handle_scrape, host, port)
+            print(f"Serving metrics on http://{host}:{port}/metrics")
+        except OSError as e:
+            print(f"Could not start the metrics endpoint on {host}:{port}: {e}")
+
+    async def _handle_scrape(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            while (await asyncio.wait_for(reader.readline(), timeout=5)).strip(): pass # Skip the headers
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/", "/metrics"):
+                status, body = "200 OK", self.render().encode("utf-8")
+            else:
+                status, body = "404 Not Found", b"Not found\n"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+
+@contextlib.contextmanager
+def track_request(kind: str):
+    """Times a Discord API request and counts it as failed if it raises."""
+    with metrics.timer("socialcredit_discord_request_seconds", kind=kind):
+        try: yield
+        except Exception:
+            metrics.inc("socialcredit_discord_request_failures_total", kind=kind)
+            raise
+
+
+metrics = Metrics()
+metrics.describe("socialcredit_word_scan_seconds", "Time spent classifying one message (cache, prefilter and full scan).")
+metrics.describe("socialcredit_storage_seconds", "Time spent in credit storage operations, by operation.")
+metrics.describe("socialcredit_discord_request_seconds", "Latency of Discord API requests made by the bot, by kind.")
+metrics.describe("socialcredit_discord_request_failures_total", "Discord API requests that failed, by kind.")
+metrics.describe("socialcredit_slash_command_seconds", "End-to-end slash command latency, by command.")
+metrics.describe("socialcredit_messages_scanned_total", "Messages scanned for forbidden words.")
+metrics.describe("socialcredit_violations_total", "Messages that contained a forbidden word.")
+
+# --- Data Handling Functions ---
+def load_generic_data(filepath):
+    if not os.path.exists(filepath): return {}
+    try:
+        with open(filepath, "r", encoding="utf-8") as f: return json.load(f)
+    except json.JSONDecodeError:
+        print(f"JSON decoding error in {filepath}. Returning empty dictionary.")
+        return {}
+
+def save_generic_data(data, filepath):
+    # Write to a temp file and rename it over the original, so a crash mid-write never truncates the data.
+    tmp_path = f"{filepath}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+        f.flush(); os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+
+@contextlib.contextmanager
+def file_lock(filepath):
+    """Exclusive lock on filepath + ".lock", held across processes (a no-op without fcntl)."""
+    if fcntl is None:
+        yield
+        return
+    with open(f"{filepath}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try: yield
+        finally: fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def update_generic_data(filepath, key: str, value):
+    """Sets one top-level key of a JSON file (None removes it). The file is re-read under a lock, so
+    keys written meanwhile by another shard process (its own servers) are kept."""
+    with file_lock(filepath):
+        data = load_generic_data(filepath)
+        if value is None: data.pop(key, None)
+        else: data[key] = value
+        save_generic_data(data, filepath)
+
+def load_snapshot(filepath) -> Tuple[dict, int]:
+    """Loads a JSON snapshot and returns it along with the last journal sequence number it includes."""
+    data = load_generic_data(filepath)
+    return data, data.pop(SNAPSHOT_SEQ_KEY, 0)
+
+def save_snapshot(data, seq: int, filepath):
+    save_generic_data({SNAPSHOT_SEQ_KEY: seq, **data}, filepath)
+
+
+class CreditStore:
+    """Interface shared by all storage backends. User and guild IDs are passed and returned as ints."""
+
+    def get_credits(self, guild_id: int, user_id: int) -> int: raise NotImplementedError
+    def update_credits(self, guild_id: int, user_id: int, amount: int, add: bool = True,
+                       actor_id: Optional[int] = None, reason: Optional[str] = None) -> Tuple[int, int]: raise NotImplementedError
+    def update_credits_bulk(self, guild_id: int, changes: List[Tuple[int, int]], add: bool = True,
+                            actor_id: Optional[int] = None, reason: Optional[str] = None) -> List[Tuple[int, int, int]]:
+        """Applies (user_id, amount) changes atomically. Returns (user_id, old_credits, new_credits) for each."""
+        raise NotImplementedError
+    def record_violation(self, guild_id: int, user_id: int, penalty: int, reason: Optional[str] = None, count: int = 1) -> Tuple[int, int]:
+        """Counts count forbidden-word hits that cost penalty credits in total. Returns the user's new (count, deducted_credits)."""
+        raise NotImplementedError
+    def iter_credits(self, guild_id: int): raise NotImplementedError
+    def decay_credits(self, guild_id: int, factor: float, regen: int, reason: Optional[str] = None) -> Tuple[array, array, array]:
+        """Applies decay_column() to all of a guild's balances. Returns (user_ids, old, new) of the balances that changed."""
+        raise NotImplementedError
+    def top_credits(self, guild_id: int, limit: int, offset: int = 0) -> List[Tuple[int, int]]: raise NotImplementedError
+    def top_violators(self, guild_id: int, limit: int, offset: int = 0) -> List[Tuple[int, dict]]: raise NotImplementedError
+    def credit_rank(self, guild_id: int, user_id: int) -> Tuple[Optional[int], int]:
+        """Returns (1-based leaderboard position or None if the user has no balance yet, number of ranked users).
+        Equal balances share a position."""
+        raise NotImplementedError
+
+    def cache_stats(self) -> dict: return {}
+
+    def start(self): pass
+    def claim(self):
+        """Called once before the bot connects. Raises RuntimeError if the data is already in use by another process."""
+    async def flush(self): pass
+    async def close(self): pass
+
+
+def decay_column(values: array, factor: float, regen: int, carries: array) -> Tuple[array, array]:
+    """Moves every balance toward DEFAULT_CREDITS: the distance shrinks by factor and balances below it also
+    regenerate regen points, without passing it. Returns (new values, new carries).
+
+    carries holds the fraction of a point each balance has decayed but not lost yet. It is added to the next
+    sweep instead of being truncated away, so hourly sweeps decay at the configured daily rate.
+    """
+    target = DEFAULT_CREDITS
+    new_values = array("q"); new_carries = array("d")
+    for value, carry in zip(values, carries):
+        exact = (value - target) * factor + carry
+        distance = int(exact); carry = exact - distance
+        if distance < 0:
+            distance += regen
+            if distance > 0: distance = 0
+        if distance == 0: carry = 0.0 # Reached DEFAULT_CREDITS, nothing left to decay
+        new_values.append(target + distance); new_carries.append(carry)
+    return new_values, new_carries
+
+
+class OrderStatisticIndex:
+    """Sorted keys in blocks of at most RANK_INDEX_BLOCK, with a Fenwick tree over the block sizes.
+
+    Adding or removing a key is a bisect plus an insert into one small block; the position of a key
+    and the keys at a position are found in O(log n). The tree is only rebuilt when a block splits or empties.
+    """
+
+    def __init__(self, keys=()):
+        keys = sorted(keys); half = RANK_INDEX_BLOCK // 2
+        self._blocks = [keys[i:i + half] for i in range(0, len(keys), half)]
+        self._rebuild()
+
+    def _rebuild(self):
+        self._maxes = [block[-1] for block in self._blocks]
+        self._len = sum(map(len, self._blocks))
+        tree = self._tree = [0] * (len(self._blocks) + 1)
+        for i, block in enumerate(self._blocks, 1):
+            tree[i] += len(block)
+            parent = i + (i & -i)
+            if parent < len(tree): tree[parent] += tree[i]
+
+    def _tree_add(self, block_index: int, delta: int):
+        tree = self._tree; i = block_index + 1
+        while i < len(tree):
+            tree[i] += delta; i += i & -i
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, key):
+        if not self._blocks:
+            self._blocks = [[key]]; self._rebuild(); return
+        i = min(bisect.bisect_left(self._maxes, key), len(self._blocks) - 1)
+        block = self._blocks[i]
+        bisect.insort(block, key)
+        self._maxes[i] = block[-1]; self._len += 1
+        if len(block) > RANK_INDEX_BLOCK:
+            half = len(block) // 2
+            self._blocks[i:i + 1] = [block[:half], block[half:]]
+            self._rebuild()
+        else:
+            self._tree_add(i, 1)
+
+    def discard(self, key):
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._blocks): return
+        block = self._blocks[i]; j = bisect.bisect_left(block, key)
+        if j == len(block) or block[j] != key: return
+        del block[j]
+        if not block:
+            del self._blocks[i]; self._rebuild()
+        else:
+            self._maxes[i] = block[-1]; self._len -= 1; self._tree_add(i, -1)
+
+    def position(self, key) -> int:
+        """Number of keys smaller than key."""
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._blocks): return self._len
+        tree = self._tree; before = 0; j = i
+        while j:
+            before += tree[j]; j -= j & -j
+        return before + bisect.bisect_left(self._blocks[i], key)
+
+    def slice(self, start: int, stop: int) -> list:
+        if start >= self._len or stop <= start: return []
+        # Walk down the tree to the block holding position start.
+        tree = self._tree; i = 0; remaining = start; step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            if i + step < len(tree) and tree[i + step] <= remaining:
+                i += step; remaining -= tree[i]
+            step >>= 1
+        keys = []; wanted = stop - start
+        for block in itertools.islice(self._blocks, i, None):
+            keys.extend(block[remaining:remaining + wanted - len(keys)]); remaining = 0
+            if len(keys) >= wanted: break
+        return keys
+
+
+def retire_journal_segment(path: str):
+    """Moves a journal segment whose records are all in a snapshot to JOURNAL_ARCHIVE_DIR, or deletes it."""
+    if JOURNAL_ARCHIVE_DIR:
+        os.makedirs(JOURNAL_ARCHIVE_DIR, exist_ok=True)
+        os.replace(path, os.path.join(JOURNAL_ARCHIVE_DIR, os.path.basename(path)))
+    else:
+        os.remove(path)
+
+
+class GuildPartition:
+    """One server's credits and forbidden-word stats, with its own snapshot file and journal.
+
+    Loading a partition reads its snapshot and replays the journal records newer than it.
+    """
+
+    def __init__(self, guild_id: int, directory: str, segments: List[str] = (), load: bool = True):
+        self.guild_id = guild_id
+        self.snapshot_path = os.path.join(directory, f"{guild_id}.json")
+        self.journal_path = os.path.join(directory, f"{guild_id}.journal.jsonl")
+        snapshot, self.seq = load_snapshot(self.snapshot_path) if load else ({}, 0)
+        self.credits = snapshot.get("credits", {}) # user ID (str) -> credits
+        self.stats = snapshot.get("stats", {}) # user ID (str) -> {"count", "deducted_credits"}
+        self.carry = snapshot.get("carry", {}) # user ID (str) -> decay_column() carry, when not 0
+        self.segments = list(segments) # Rotated journal segments whose records may not be in the snapshot yet
+        # Ranking indexes, built on the first ranking query and then kept up to date by every change.
+        self.credit_ranks: Optional[OrderStatisticIndex] = None # (-credits, user_id)
+        self.violation_ranks: Optional[OrderStatisticIndex] = None # (-count, -deducted_credits, user_id)
+        self.journal = None # Opened on the first change
+        self.unsynced = False
+        self.pending = self._replay() if load else 0 # Journal records not in the snapshot yet
+
+    def size(self) -> int:
+        return len(self.credits) + len(self.stats)
+
+    # --- Journal ---
+    def _replay(self) -> int:
+        snapshot_seq = self.seq; replayed = 0
+        for path in self.segments + [self.journal_path]:
+            if not os.path.exists(path): continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try: record = json.loads(line)
+                    except json.JSONDecodeError:
+                        print(f"Skipping damaged journal record in {path}: {line.strip()[:80]}")
+                        continue
+                    if record["s"] <= snapshot_seq: continue
+                    self.seq = max(self.seq, record["s"])
+                    replayed += 1 # Quarantined ones too, so compaction moves them out of the replay path
+                    try: self.apply(record)
+                    except Exception as e: self._quarantine(line, e)
+        return replayed
+
+    def _quarantine(self, line: str, error: Exception):
+        """Sets aside a journal record that cannot be applied, so one bad record never makes the server unloadable."""
+        path = self.journal_path.replace(".journal.jsonl", ".quarantine.jsonl")
+        print(f"Skipping journal record of {self.guild_id} that cannot be applied ({error!r}); kept in {path}")
+        with open(path, "a", encoding="utf-8") as f: f.write(line if line.endswith("\n") else line + "\n")
+
+    def apply(self, record: dict):
+        if record["op"] == "hit": self.apply_violation(record["u"], record["v"], record.get("c", 1))
+        elif record["op"] == "decay": self.apply_decay(record["f"], record["n"])
+        else:
+            for user_id, value in record.get("b") or [(record["u"], record["v"])]:
+                self.apply_credits(user_id, value, record["op"] == "add")
+
+    def append(self, op: str, actor_id: Optional[int], reason: Optional[str], **fields):
+        # fields is u/v for single changes, b=[[user_id, value], ...] for bulk changes (one record, so replayed
+        # all or nothing) and f/n (factor, regeneration) for decay sweeps, which are replayed by recomputing them.
+        self.seq += 1
+        record = {"s": self.seq, "t": int(time.time()), "op": op, "g": self.guild_id, **fields}
+        if actor_id is not None: record["a"] = actor_id
+        if reason: record["r"] = reason
+        if self.journal is None: self.journal = open(self.journal_path, "a", encoding="utf-8")
+        self.journal.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.journal.flush()
+        self.pending += 1; self.unsynced = True
+
+    def close(self):
+        if self.journal is None: return
+        if self.unsynced: os.fsync(self.journal.fileno())
+        self.journal.close(); self.journal = None; self.unsynced = False
+
+    # --- Compaction ---
+    def rotate(self):
+        """Copies the data for a snapshot and moves the journal aside. Runs on the loop, between writes."""
+        if self.journal is not None:
+            self.journal.close(); self.journal = None; self.unsynced = False
+        if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path):
+            segment = f"{self.journal_path}.{self.seq}"
+            os.replace(self.journal_path, segment)
+            self.segments.append(segment)
+        self.pending = 0
+        data = {"credits": dict(self.credits), "stats": {u: dict(s) for u, s in self.stats.items()}, "carry": dict(self.carry)}
+        return data, self.seq, list(self.segments)
+
+    def write_snapshot(self, data: dict, seq: int, segments: List[str]):
+        save_snapshot(data, seq, self.snapshot_path)
+        # Everything up to seq is now in the snapshot, so the rotated segments can leave the replay path.
+        for path in segments: retire_journal_segment(path)
+
+    def compact_sync(self):
+        if not self.pending: return
+        data, seq, segments = self.rotate()
+        try: self.write_snapshot(data, seq, segments)
+        except Exception:
+            self.pending = max(self.pending, 1) # Retried on the next compaction
+            raise
+        self.segments = [path for path in self.segments if path not in segments]
+
+    # --- Data ---
+    def apply_credits(self, user_id: int, amount: int, add: bool) -> Tuple[int, int]:
+        old_credits = self.credits.get(str(user_id), DEFAULT_CREDITS)
+        new_val = old_credits + amount if add else amount
+        if self.credit_ranks is not None:
+            if str(user_id) in self.credits: self.credit_ranks.discard((-old_credits, int(user_id)))
+            self.credit_ranks.add((-new_val, int(user_id)))
+        self.credits[str(user_id)] = new_val
+        self.carry.pop(str(user_id), None) # Decay starts over from the new balance
+        return old_credits, new_val
+
+    def apply_decay(self, factor: float, regen: int) -> Tuple[array, array, array]:
+        keys = list(self.credits); old_values = array("q", self.credits.values())
+        carry = self.carry
+        new_values, new_carries = decay_column(old_values, factor, regen, array("d", [carry.get(key, 0.0) for key in keys]))
+        self.carry = {key: value for key, value in zip(keys, new_carries) if value}
+        changed = list(map(operator.ne, old_values, new_values))
+        keys = list(itertools.compress(keys, changed))
+        new_values = array("q", itertools.compress(new_values, changed))
+        self.credits.update(zip(keys, new_values))
+        user_ids = array("q", map(int, keys)); old_values = array("q", itertools.compress(old_values, changed))
+        index = self.credit_ranks
+        if index is not None:
+            if len(user_ids) > len(index) // 4: self.credit_ranks = None # Cheaper to rebuild on the next query
+            else:
+                for user_id, old_credits, new_credits in zip(user_ids, old_values, new_values):
+                    index.discard((-old_credits, user_id)); index.add((-new_credits, user_id))
+        return user_ids, old_values, new_values
+
+    def apply_violation(self, user_id: int, penalty: int, count: int = 1) -> Tuple[int, int]:
+        user_stats = self.stats.setdefault(str(user_id), {"count": 0, "deducted_credits": 0})
+        index = self.violation_ranks
+        if index is not None: index.discard((-user_stats["count"], -user_stats["deducted_credits"], int(user_id)))
+        user_stats["count"] += count; user_stats["deducted_credits"] += penalty
+        if index is not None: index.add((-user_stats["count"], -user_stats["deducted_credits"], int(user_id)))
+        return user_stats["count"], user_stats["deducted_credits"]
+
+    def credit_index(self) -> OrderStatisticIndex:
+        if self.credit_ranks is None:
+            self.credit_ranks = OrderStatisticIndex((-credits_val, int(user_id)) for user_id, credits_val in self.credits.items())
+        return self.credit_ranks
+
+    def violation_index(self) -> OrderStatisticIndex:
+        if self.violation_ranks is None:
+            self.violation_ranks = OrderStatisticIndex(
+                (-user_stats["count"], -user_stats["deducted_credits"], int(user_id)) for user_id, user_stats in self.stats.items())
+        return self.violation_ranks
+
+
+class JsonCreditStore(CreditStore):
+    """Keeps credits and forbidden-word stats in memory, in one GuildPartition per server.
+
+    A server's partition is loaded on first access. Once more than JSON_CACHE_MAX_GUILDS partitions or
+    JSON_CACHE_MAX_ENTRIES users are loaded, the least recently used partitions are evicted; their journals
+    hold every change, so nothing is written on eviction. Every change is one compact line appended to
+    its server's journal, and each server's snapshot is rewritten only when that server changed.
+    """
+
+    def __init__(self, directory: str = JSON_DATA_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._partitions = collections.OrderedDict() # guild_id -> GuildPartition, least recently used first
+        self._busy = set() # Guilds whose snapshot is being written; they are never evicted meanwhile
+        self.loads = 0; self.evictions = 0
+        self._known_guilds = set(); self._leftover_segments = collections.defaultdict(list)
+        segment_marker = ".journal.jsonl."
+        for name in os.listdir(directory):
+            guild_part = name.split(".", 1)[0]
+            if not guild_part.isdigit(): continue
+            self._known_guilds.add(int(guild_part))
+            seq_part = name.partition(segment_marker)[2]
+            if seq_part.isdigit(): self._leftover_segments[int(guild_part)].append((int(seq_part), os.path.join(directory, name)))
+        self._leftover_segments = {g: [path for _, path in sorted(segments)] for g, segments in self._leftover_segments.items()}
+        self._split_legacy_files()
+        self._lock_file = None
+        self._compact_needed: Optional[asyncio.Event] = None
+        self._io_lock: Optional[asyncio.Lock] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _split_legacy_files(self):
+        """One-time move from the single-file layout (DATA_FILE, FORBIDDEN_STATS_FILE and JOURNAL_FILE) to partitions."""
+        journal_dir = os.path.dirname(JOURNAL_FILE) or "."; prefix = os.path.basename(JOURNAL_FILE) + "."
+        journal_paths = [path for _, path in sorted(
+            (int(name[len(prefix):]), os.path.join(journal_dir, name))
+            for name in os.listdir(journal_dir) if name.startswith(prefix) and name[len(prefix):].isdigit()
+        )] + [JOURNAL_FILE]
+        legacy_paths = [path for path in [DATA_FILE, FORBIDDEN_STATS_FILE] + journal_paths if os.path.exists(path)]
+        if not legacy_paths: return
+        credits_data, credits_seq = load_snapshot(DATA_FILE)
+        stats_data, stats_seq = load_snapshot(FORBIDDEN_STATS_FILE)
+        partitions = {}
+        def partition(guild_id) -> GuildPartition:
+            guild_id = int(guild_id)
+            if guild_id not in partitions: partitions[guild_id] = GuildPartition(guild_id, self.directory, load=False)
+            return partitions[guild_id]
+        for guild_id, users in credits_data.items(): partition(guild_id).credits.update(users)
+        for guild_id, users in stats_data.items(): partition(guild_id).stats.update(users)
+        for path in journal_paths:
+            if not os.path.exists(path): continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try: record = json.loads(line)
+                    except json.JSONDecodeError:
+                        print(f"Skipping damaged journal record in {path}: {line.strip()[:80]}")
+                        continue
+                    if record["s"] > (stats_seq if record["op"] == "hit" else credits_seq): partition(record["g"]).apply(record)
+        for guild_partition in partitions.values():
+            save_snapshot({"credits": guild_partition.credits, "stats": guild_partition.stats}, 0, guild_partition.snapshot_path)
+        # Only renamed once every partition is written, so an interrupted split simply runs again.
+        for path in legacy_paths: os.replace(path, f"{path}.migrated")
+        self._known_guilds.update(partitions)
+        print(f"Split {len(partitions)} server(s) from {', '.join(legacy_paths)} into {self.directory}/ "
+              "(the old files were renamed to *.migrated).")
+
+    def guild_ids(self) -> List[int]:
+        """Every server with stored data, loaded or not."""
+        return sorted(self._known_guilds)
+
+    def claim(self):
+        # Everything lives in this process's memory, so a second process would silently overwrite its changes.
+        if fcntl is None: return
+        self._lock_file = open(os.path.join(self.directory, "store.lock"), "a")
+        try: fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close(); self._lock_file = None
+            raise RuntimeError(f"{self.directory} is in use by another bot process. "
+                               'Processes can only share data through STORAGE_BACKEND = "sqlite".')
+
+    # --- Partitions ---
+    def _partition(self, guild_id: int) -> GuildPartition:
+        guild_id = int(guild_id)
+        partition = self._partitions.get(guild_id)
+        if partition is not None:
+            self._partitions.move_to_end(guild_id)
+            return partition
+        with metrics.timer("socialcredit_storage_seconds", op="partition_load"):
+            partition = self._partitions[guild_id] = GuildPartition(guild_id, self.directory, self._leftover_segments.pop(guild_id, []))
+        self.loads += 1
+        if partition.pending and self._compact_needed and partition.pending >= SNAPSHOT_JOURNAL_THRESHOLD: self._compact_needed.set()
+        self._evict()
+        return partition
+
+    def _evict(self):
+        """Evicts least recently used partitions until the loaded ones fit the budget. The newest one always stays.
+
+        A partition with journal records not in its snapshot is compacted first (by the compaction task, in a
+        worker thread, when the loop runs), so evicted servers never pile up records that every load replays.
+        """
+        entries = sum(partition.size() for partition in self._partitions.values())
+        for guild_id in list(self._partitions)[:-1]:
+            if len(self._partitions) <= JSON_CACHE_MAX_GUILDS and entries <= JSON_CACHE_MAX_ENTRIES: return
+            if guild_id in self._busy: continue
+            partition = self._partitions[guild_id]
+            if partition.pending:
+                if self._compact_needed is not None:
+                    self._compact_needed.set() # Evicted by the compaction task once its snapshot is written
+                    continue
+                try: partition.compact_sync()
+                except Exception as e:
+                    print(f"Error compacting social credit data of {guild_id}: {e}")
+                    continue
+            del self._partitions[guild_id]
+            partition.close()
+            # Segments left by a failed snapshot hold changes the snapshot lacks; the next load must replay them.
+            if partition.segments: self._leftover_segments[guild_id] = partition.segments
+            entries -= partition.size(); self.evictions += 1
+
+    def _append(self, partition: GuildPartition, op: str, actor_id: Optional[int], reason: Optional[str], **fields):
+        partition.append(op, actor_id, reason, **fields)
+        self._known_guilds.add(partition.guild_id)
+        if self._compact_needed and partition.pending >= SNAPSHOT_JOURNAL_THRESHOLD:
+            self._compact_needed.set()
+
+    def cache_stats(self) -> dict:
+        return {"partitions_loaded": len(self._partitions), "entries_loaded": sum(p.size() for p in self._partitions.values()),
+                "partition_loads": self.loads, "partition_evictions": self.evictions}
+
+    # --- Background tasks ---
+    def start(self):
+        """Starts the background fsync and compaction tasks. Safe to call again on reconnects."""
+        if self._tasks and not any(t.done() for t in self._tasks): return
+        self._compact_needed = asyncio.Event()
+        self._io_lock = asyncio.Lock()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._fsync_loop()), loop.create_task(self._compact_loop())]
+
+    async def _fsync_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(JOURNAL_FSYNC_INTERVAL_SECONDS)
+            async with self._io_lock:
+                for partition in [p for p in self._partitions.values() if p.unsynced and p.journal]:
+                    partition.unsynced = False
+                    try: await loop.run_in_executor(None, os.fsync, partition.journal.fileno())
+                    except Exception as e: print(f"Error syncing the credit journal of {partition.guild_id}: {e}")
+
+    async def _compact_loop(self):
+        while True:
+            # Not wait_for: it swallows a cancel that lands as the event is set, and close() would wait forever.
+            waiter = asyncio.ensure_future(self._compact_needed.wait())
+            try: await asyncio.wait([waiter], timeout=SNAPSHOT_INTERVAL_SECONDS)
+            finally: waiter.cancel()
+            self._compact_needed.clear()
+            try: await self.flush()
+            except Exception as e: print(f"Error compacting social credit data: {e}")
+            self._evict() # Loaded partitions may have grown past the budget since the last load
+
+    async def flush(self):
+        """Writes fresh snapshots of the changed partitions in a worker thread and compacts their journals."""
+        if self._io_lock is None: return self.flush_sync()
+        loop = asyncio.get_running_loop()
+        async with self._io_lock:
+            for partition in [p for p in self._partitions.values() if p.pending]:
+                if self._partitions.get(partition.guild_id) is not partition: continue # Evicted while an earlier one was written
+                self._busy.add(partition.guild_id)
+                try:
+                    data, seq, segments = partition.rotate()
+                    with metrics.timer("socialcredit_storage_seconds", op="snapshot"):
+                        await loop.run_in_executor(None, partition.write_snapshot, data, seq, segments)
+                    partition.segments = [path for path in partition.segments if path not in segments]
+                except Exception as e:
+                    # The rotated segments stay in partition.segments, so nothing is lost; retry on the next pass.
+                    print(f"Error writing the snapshot of {partition.guild_id}: {e}")
+                    partition.pending = max(partition.pending, 1)
+                finally:
+                    self._busy.discard(partition.guild_id)
+
+    def flush_sync(self):
+        """Compacts immediately. Used when no event loop is available."""
+        for partition in self._partitions.values(): partition.compact_sync()
+
+    async def close(self):
+        for task in self._tasks: task.cancel()
+        for task in self._tasks:
+            try: await task
+            except asyncio.CancelledError: pass
+        self._tasks = []
+        await self.flush()
+        for partition in self._partitions.values(): partition.close()
+        if self._lock_file: self._lock_file.close()
+
+    # --- Data access ---
+    def get_credits(self, guild_id: int, user_id: int) -> int:
+        return self._partition(guild_id).credits.get(str(user_id), DEFAULT_CREDITS)
+
+    def update_credits(self, guild_id: int, user_id: int, amount: int, add: bool = True,
+                       actor_id: Optional[int] = None, reason: Optional[str] = None) -> Tuple[int, int]:
+        partition = self._partition(guild_id)
+        self._append(partition, "add" if add else "set", actor_id, reason, u=user_id, v=amount)
+        return partition.apply_credits(user_id, amount, add)
+
+    def update_credits_bulk(self, guild_id: int, changes: List[Tuple[int, int]], add: bool = True,
+                            actor_id: Optional[int] = None, reason: Optional[str] = None) -> List[Tuple[int, int, int]]:
+        if not changes: return []
+        partition = self._partition(guild_id)
+        self._append(partition, "add" if add else "set", actor_id, reason, b=[[u, v] for u, v in changes])
+        return [(user_id, *partition.apply_credits(user_id, amount, add)) for user_id, amount in changes]
+
+    def record_violation(self, guild_id: int, user_id: int, penalty: int, reason: Optional[str] = None, count: int = 1) -> Tuple[int, int]:
+        partition = self._partition(guild_id)
+        if count == 1: self._append(partition, "hit", None, reason, u=user_id, v=penalty)
+        else: self._append(partition, "hit", None, reason, u=user_id, v=penalty, c=count)
+        return partition.apply_violation(user_id, penalty, count)
+
+    def decay_credits(self, guild_id: int, factor: float, regen: int, reason: Optional[str] = None) -> Tuple[array, array, array]:
+        partition = self._partition(guild_id)
+        if not partition.credits: return array("q"), array("q"), array("q")
+        # Applied before it is journaled, so a sweep that fails here never leaves a record replay would choke on.
+        changed = partition.apply_decay(factor, regen)
+        self._append(partition, "decay", None, reason, f=factor, n=regen)
+        return changed
+
+    def iter_credits(self, guild_id: int):
+        # Iterate over a copy so the caller may yield to the event loop while changes keep coming in.
+        for user_id, credits_val in list(self._partition(guild_id).credits.items()):
+            yield int(user_id), credits_val
+
+    def top_credits(self, guild_id: int, limit: int, offset: int = 0) -> List[Tuple[int, int]]:
+        return [(user_id, -negated) for negated, user_id in self._partition(guild_id).credit_index().slice(offset, offset + limit)]
+
+    def top_violators(self, guild_id: int, limit: int, offset: int = 0) -> List[Tuple[int, dict]]:
+        partition = self._partition(guild_id)
+        return [(user_id, dict(partition.stats[str(user_id)])) for _, _, user_id in partition.violation_index().slice(offset, offset + limit)]
+
+    def credit_rank(self, guild_id: int, user_id: int) -> Tuple[Optional[int], int]:
+        partition = self._partition(guild_id)
+        index = partition.credit_index()
+        credits_val = partition.credits.get(str(user_id))
+        if credits_val is None: return None, len(index)
+        return index.position((-credits_val,)) + 1, len(index) # (-credits,) sorts before every (-credits, user_id)
+
+
+class SqliteCreditStore(CreditStore):
+    """SQLite (WAL mode) backend. Leaderboards are served straight from the indexes with LIMIT/OFFSET.
+
+    A member's position needs a count SQLite can only get by scanning, so credit_rank uses an in-memory
+    OrderStatisticIndex per server instead, built on first use and kept up to date by this process's writes.
+    That holds because a server's data is only ever written by the one process running its shard.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS credits (
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            credits INTEGER NOT NULL,
+            decay_carry REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (guild_id, user_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_credits_rank ON credits (guild_id, credits);
+        CREATE TABLE IF NOT EXISTS forbidden_stats (
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            deducted_credits INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (guild_id, user_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_forbidden_rank ON forbidden_stats (guild_id, count, deducted_credits);
+        CREATE TABLE IF NOT EXISTS credit_journal (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            value INTEGER NOT NULL,
+            actor_id INTEGER,
+            reason TEXT
+        );
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        # Autocommit: every upsert is its own short transaction. Reads never wait (WAL); writes take the
+        # write lock up front (BEGIN IMMEDIATE) and queue behind other shard processes for up to the busy timeout.
+        self.conn = sqlite3.connect(db_path, isolation_level=None, timeout=SQLITE_BUSY_TIMEOUT_SECONDS)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        if "decay_carry" not in [row[1] for row in self.conn.execute("PRAGMA table_info(credits)")]:
+            self.conn.execute("ALTER TABLE credits ADD COLUMN decay_carry REAL NOT NULL DEFAULT 0") # Databases from before decay carried fractions
+        self._rank_indexes = collections.OrderedDict() # guild_id -> OrderStatisticIndex of (-credits, user_id), LRU
+
+    async def close(self):
+        self.conn.close()
+
+    def _rank_index(self, guild_id: int) -> OrderStatisticIndex:
+        index = self._rank_indexes.get(guild_id)
+        if index is not None:
+            self._rank_indexes.move_to_end(guild_id)
+            return index
+        rows = self.conn.execute("SELECT credits, user_id FROM credits WHERE guild_id = ?", (guild_id,))
+        index = self._rank_indexes[guild_id] = OrderStatisticIndex((-credits_val, user_id) for credits_val, user_id in rows)
+        if len(self._rank_indexes) > SQLITE_RANK_INDEX_MAX_GUILDS: self._rank_indexes.popitem(last=False)
+        return index
+
+    def _rerank(self, guild_id: int, changes):
+        # Called once a write committed, with (user_id, old credits, new credits) per change.
+        index = self._rank_indexes.get(guild_id)
+        if index is None: return
+        for user_id, old_credits, new_credits in changes:
+            index.discard((-old_credits, user_id)); index.add((-new_credits, user_id))
+
+    def get_credits(self, guild_id: int, user_id: int) -> int:
+        row = self.conn.execute("SELECT credits FROM credits WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)).fetchone()
+        return row[0] if row else DEFAULT_CREDITS
+
+    def _journal(self, op: str, guild_id: int, user_id: int, value: int, actor_id: Optional[int], reason: Optional[str]):
+        # The audit row is written in the same transaction as the change it describes.
+        self.conn.execute(
+            "INSERT INTO credit_journal (ts, op, guild_id, user_id, value, actor_id, reason) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (int(time.time()), op, guild_id, user_id, value, actor_id, reason)
+        )
+
+    def _upsert_credits(self, guild_id: int, user_id: int, amount: int, add: bool) -> Tuple[int, int]:
+        # Must run inside a transaction.
+        if add:
+            new_val = self.conn.execute(
+                "INSERT INTO credits (guild_id, user_id, credits) VALUES (?, ?, ?) "
+                "ON CONFLICT (guild_id, user_id) DO UPDATE SET credits = credits + ?, decay_carry = 0 RETURNING credits",
+                (guild_id, user_id, DEFAULT_CREDITS + amount, amount)
+            ).fetchone()[0]
+            return new_val - amount, new_val
+        old_credits = self.get_credits(guild_id, user_id)
+        self.conn.execute(
+            "INSERT INTO credits (guild_id, user_id, credits) VALUES (?, ?, ?) "
+            "ON CONFLICT (guild_id, user_id) DO UPDATE SET credits = excluded.credits, decay_carry = 0",
+            (guild_id, user_id, amount)
+        )
+        return old_credits, amount
+
+    def update_credits(self, guild_id: int, user_id: int, amount: int, add: bool = True,
+                       actor_id: Optional[int] = None, reason: Optional[str] = None) -> Tuple[int, int]:
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self._journal("add" if add else "set", guild_id, user_id, amount, actor_id, reason)
+            old_credits, new_credits = self._upsert_credits(guild_id, user_id, amount, add)
+        self._rerank(guild_id, [(user_id, old_credits, new_credits)])
+        return old_credits, new_credits
+
+    def update_credits_bulk(self, guild_id: int, changes: List[Tuple[int, int]], add: bool = True,
+                            actor_id: Optional[int] = None, reason: Optional[str] = None) -> List[Tuple[int, int, int]]:
+        if not changes: return []
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            now = int(time.time()); op = "add" if add else "set"
+            self.conn.executemany(
+                "INSERT INTO credit_journal (ts, op, guild_id, user_id, value, actor_id, reason) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(now, op, guild_id, user_id, amount, actor_id, reason) for user_id, amount in changes]
+            )
+            results = [(user_id, *self._upsert_credits(guild_id, user_id, amount, add)) for user_id, amount in changes]
+        self._rerank(guild_id, results)
+        return results
+
+    def decay_credits(self, guild_id: int, factor: float, regen: int, reason: Optional[str] = None) -> Tuple[array, array, array]:
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            rows = self.conn.execute(
+                "SELECT user_id, credits, decay_carry FROM credits WHERE guild_id = ? AND credits != ?", (guild_id, DEFAULT_CREDITS)
+            ).fetchall()
+            old_values = array("q", [row[1] for row in rows]); old_carries = array("d", [row[2] for row in rows])
+            new_values, new_carries = decay_column(old_values, factor, regen, old_carries)
+            changed = list(map(operator.ne, old_values, new_values))
+            user_ids = array("q", itertools.compress([row[0] for row in rows], changed))
+            # Computed here rather than in SQL, so both backends run the very same arithmetic.
+            updates = [(value, carry, guild_id, row[0]) for row, value, carry, old_value, old_carry
+                       in zip(rows, new_values, new_carries, old_values, old_carries) if value != old_value or carry != old_carry]
+            if not updates: return user_ids, array("q"), array("q")
+            # One audit row for the whole sweep (user 0); the change per user follows from the parameters.
+            self._journal("decay", guild_id, 0, len(user_ids), None, f"{reason or 'decay'} factor={factor!r} regen={regen}")
+            self.conn.executemany("UPDATE credits SET credits = ?, decay_carry = ? WHERE guild_id = ? AND user_id = ?", updates)
+        old_values = array("q", itertools.compress(old_values, changed)); new_values = array("q", itertools.compress(new_values, changed))
+        index = self._rank_indexes.get(guild_id)
+        if index is not None and len(user_ids) > len(index) // 4: del self._rank_indexes[guild_id] # Cheaper to rebuild on the next query
+        else: self._rerank(guild_id, zip(user_ids, old_values, new_values))
+        return user_ids, old_values, new_values
+
+    def iter_credits(self, guild_id: int, page_size: int = 1000):
+        # Keyset pagination on the primary key, so no cursor stays open while the caller yields.
+        last_user_id = -1
+        while True:
+            page = self.conn.execute(
+                "SELECT user_id, credits FROM credits WHERE guild_id = ? AND user_id > ? ORDER BY user_id LIMIT ?",
+                (guild_id, last_user_id, page_size)
+            ).fetchall()
+            yield from page
+            if len(page) < page_size: return
+            last_user_id = page[-1][0]
+
+    def record_violation(self, guild_id: int, user_id: int, penalty: int, reason: Optional[str] = None, count: int = 1) -> Tuple[int, int]:
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self._journal("hit", guild_id, user_id, penalty, None, reason if count == 1 else f"{reason} (x{count})")
+            return self.conn.execute(
+                "INSERT INTO forbidden_stats (guild_id, user_id, count, deducted_credits) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (guild_id, user_id) DO UPDATE SET count = count + excluded.count, deducted_credits = deducted_credits + excluded.deducted_credits "
+                "RETURNING count, deducted_credits",
+                (guild_id, user_id, count, penalty)
+            ).fetchone()
+
+    def top_credits(self, guild_id: int, limit: int, offset: int = 0) -> List[Tuple[int, int]]:
+        return self.conn.execute(
+            "SELECT user_id, credits FROM credits WHERE guild_id = ? ORDER BY credits DESC LIMIT ? OFFSET ?",
+            (guild_id, limit, offset)
+        ).fetchall()
+
+    def top_violators(self, guild_id: int, limit: int, offset: int = 0) -> List[Tuple[int, dict]]:
+        rows = self.conn.execute(
+            "SELECT user_id, count, deducted_credits FROM forbidden_stats WHERE guild_id = ? "
+            "ORDER BY count DESC, deducted_credits DESC LIMIT ? OFFSET ?",
+            (guild_id, limit, offset)
+        ).fetchall()
+        return [(user_id, {"count": count, "deducted_credits": deducted}) for user_id, count, deducted in rows]
+
+    def credit_rank(self, guild_id: int, user_id: int) -> Tuple[Optional[int], int]:
+        index = self._rank_index(guild_id)
+        row = self.conn.execute("SELECT credits FROM credits WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)).fetchone()
+        if row is None: return None, len(index)
+        return index.position((-row[0],)) + 1, len(index) # (-credits,) sorts before every (-credits, user_id)
+
+
+def migrate_json_to_sqlite(data_dir: str = JSON_DATA_DIR, db_path: str = SQLITE_DB_FILE):
+    """One-shot import of the JSON data into the SQLite database. Existing rows for the same users are overwritten."""
+    # Use a JSON store so any journal records newer than the snapshots are replayed before importing.
+    json_store = JsonCreditStore(data_dir)
+    sqlite_store = SqliteCreditStore(db_path)
+    conn = sqlite_store.conn
+    credit_rows = stats_rows = 0
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for guild_id in json_store.guild_ids():
+            # One server at a time, so the import stays within the same memory budget as the bot.
+            partition = json_store._partition(guild_id)
+            conn.executemany(
+                "INSERT INTO credits (guild_id, user_id, credits, decay_carry) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (guild_id, user_id) DO UPDATE SET credits = excluded.credits, decay_carry = excluded.decay_carry",
+                [(guild_id, int(u), c, partition.carry.get(u, 0.0)) for u, c in partition.credits.items()]
+            )
+            conn.executemany(
+                "INSERT INTO forbidden_stats (guild_id, user_id, count, deducted_credits) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (guild_id, user_id) DO UPDATE SET count = excluded.count, deducted_credits = excluded.deducted_credits",
+                [(guild_id, int(u), s["count"], s["deducted_credits"]) for u, s in partition.stats.items()]
+            )
+            credit_rows += len(partition.credits); stats_rows += len(partition.stats)
+    conn.close()
+    json_store.flush_sync()
+    for partition in json_store._partitions.values(): partition.close()
+    print(f"Imported {credit_rows} credit rows and {stats_rows} forbidden-word rows into {db_path}.")
+
+
+def json_data_exists() -> bool:
+    """Whether JSON backend data (per-server files or the older single-file layout) is present."""
+    if any(os.path.exists(path) for path in (DATA_FILE, FORBIDDEN_STATS_FILE, JOURNAL_FILE)): return True
+    return os.path.isdir(JSON_DATA_DIR) and any(name.split(".", 1)[0].isdigit() for name in os.listdir(JSON_DATA_DIR))
+
+def sqlite_has_data(db_path: str = SQLITE_DB_FILE) -> bool:
+    if not os.path.exists(db_path): return False
+    conn = sqlite3.connect(db_path)
+    try: return bool(conn.execute("SELECT EXISTS (SELECT 1 FROM credits) OR EXISTS (SELECT 1 FROM forbidden_stats)").fetchone()[0])
+    except sqlite3.OperationalError: return False # No tables yet
+    finally: conn.close()
+
+def create_credit_store() -> CreditStore:
+    if STORAGE_BACKEND == "sqlite" or SHARD_IDS is not None: return SqliteCreditStore(SQLITE_DB_FILE)
+    return JsonCreditStore(JSON_DATA_DIR)
+
+with metrics.timer("socialcredit_storage_seconds", op="load"):
+    store = create_credit_store()
+
+def get_user_credits(guild_id: int, user_id: int) -> int:
+    with metrics.timer("socialcredit_storage_seconds", op="get"):
+        return store.get_credits(guild_id, user_id)
+
+def update_user_credits(guild_id: int, user_id: int, amount: int, add: bool = True,
+                        actor_id: Optional[int] = None, reason: Optional[str] = None) -> Tuple[int, int]:
+    with metrics.timer("socialcredit_storage_seconds", op="update"):
+        old_credits, new_credits = store.update_credits(guild_id, user_id, amount, add, actor_id=actor_id, reason=reason)
+    leaderboard_pages.invalidate(guild_id, "credits", max(old_credits, new_credits))
+    credit_history.record(guild_id, user_id, old_credits, new_credits)
+    return old_credits, new_credits
+
+def update_credits_bulk(guild_id: int, changes: List[Tuple[int, int]], add: bool = True,
+                        actor_id: Optional[int] = None, reason: Optional[str] = None) -> List[Tuple[int, int, int]]:
+    with metrics.timer("socialcredit_storage_seconds", op="bulk_update"):
+        results = store.update_credits_bulk(guild_id, changes, add, actor_id=actor_id, reason=reason)
+    if results: leaderboard_pages.invalidate(guild_id, "credits", max(max(old, new) for _, old, new in results))
+    for user_id, old_credits, new_credits in results: credit_history.record(guild_id, user_id, old_credits, new_credits)
+    return results
+
+def update_forbidden_stats(guild_id: int, user_id: int, penalty: int, reason: Optional[str] = None, count: int = 1):
+    with metrics.timer("socialcredit_storage_seconds", op="record_violation"):
+        new_stats = store.record_violation(guild_id, user_id, penalty, reason=reason, count=count)
+    leaderboard_pages.invalidate(guild_id, "violators", tuple(new_stats))
+
+def get_credit_rank(guild_id: int, user_id: int) -> Tuple[Optional[int], int]:
+    with metrics.timer("socialcredit_storage_seconds", op="rank"):
+        return store.credit_rank(guild_id, user_id)
+
+def iter_ranked(fetch_page, page_size: int):
+    """Walks a ranked store query page by page, so callers that skip entries only read as far as they need."""
+    offset = 0
+    while True:
+        with metrics.timer("socialcredit_storage_seconds", op="ranking_page"):
+            page = fetch_page(page_size, offset)
+        yield from page
+        if len(page) < page_size: return
+        offset += page_size
+
+# --- Credit History ---
+HISTORY_DIR = "credit_history" # One binary file per server. None keeps no history.
+HISTORY_RAW_SECONDS = 2 * 86400 # Every change is kept for this long (and at most HISTORY_RAW_MAX_SAMPLES per user)...
+HISTORY_RAW_MAX_SAMPLES = 200
+HISTORY_HOURLY_SECONDS = 14 * 86400 # ...then merged into hourly buckets, kept for this long...
+HISTORY_DAILY_SECONDS = 365 * 86400 # ...then into daily buckets, dropped after this long
+HISTORY_FLUSH_INTERVAL_SECONDS = 60 # New history records are appended to the servers' logs at least this often
+HISTORY_COMPACT_MIN_BYTES = 1024 * 1024 # A log is folded into its base file once it is larger than both this and the base
+HISTORY_CACHE_MAX_GUILDS = JSON_CACHE_MAX_GUILDS # Servers whose history is kept loaded; least recently used ones are unloaded...
+HISTORY_CACHE_MAX_SERIES = 100_000 # ...beyond this many servers or users (at most about 31 KB each)
+HISTORY_FILE_MAGIC = b"SCH2"
+_HISTORY_GENERATION = struct.Struct("<q") # Follows the magic; the base file holds everything up to this generation's log
+_HISTORY_HEADER = struct.Struct("<qIII") # user_id, then the lengths of the raw, hourly and daily arrays
+_SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+def _fold_bucket(buckets: array, start: int, close: int, low: int, high: int, count: int):
+    # Buckets are (start, close, low, high, count) runs in one array, oldest first.
+    if buckets and buckets[-5] == start:
+        buckets[-4] = close; buckets[-3] = min(buckets[-3], low); buckets[-2] = max(buckets[-2], high); buckets[-1] += count
+    else:
+        buckets.extend((start, close, low, high, count))
+
+
+class UserHistory:
+    """One user's balance over time: raw (timestamp, balance) pairs, then hourly and daily buckets,
+    each tier a flat array('q'). The tiers are bounded, so a user never costs more than about 31 KB,
+    however many changes they had."""
+
+    __slots__ = ("raw", "hourly", "daily")
+
+    def __init__(self, raw: array = None, hourly: array = None, daily: array = None):
+        self.raw = raw if raw is not None else array("q")
+        self.hourly = hourly if hourly is not None else array("q")
+        self.daily = daily if daily is not None else array("q")
+
+    def add(self, timestamp: int, balance: int):
+        raw = self.raw; raw.extend((timestamp, balance))
+        cutoff = timestamp - HISTORY_RAW_SECONDS; n = 0
+        while n < len(raw) and (raw[n] < cutoff or len(raw) - n > 2 * HISTORY_RAW_MAX_SAMPLES):
+            _fold_bucket(self.hourly, raw[n] - raw[n] % 3600, raw[n + 1], raw[n + 1], raw[n + 1], 1); n += 2
+        if n: del raw[:n]
+        hourly = self.hourly; cutoff = timestamp - HISTORY_HOURLY_SECONDS; n = 0
+        while n < len(hourly) and hourly[n] < cutoff:
+            _fold_bucket(self.daily, hourly[n] - hourly[n] % 86400, *hourly[n + 1:n + 5]); n += 5
+        if n: del hourly[:n]
+        daily = self.daily; cutoff = timestamp - HISTORY_DAILY_SECONDS; n = 0
+        while n < len(daily) and daily[n] < cutoff: n += 5
+        if n: del daily[:n]
+
+    def first_recorded(self) -> int:
+        return (self.daily or self.hourly or self.raw)[0]
+
+    def points(self) -> Tuple[list, list]:
+        """(timestamps, balances) of every raw sample and bucket close, oldest first. A bucket's close
+        is placed at the bucket's end, or at the next sample if that comes earlier."""
+        timestamps = [start + 86400 for start in self.daily[0::5]] + [start + 3600 for start in self.hourly[0::5]] + list(self.raw[0::2])
+        balances = list(self.daily[1::5]) + list(self.hourly[1::5]) + list(self.raw[1::2])
+        for i in range(len(timestamps) - 2, -1, -1):
+            if timestamps[i] > timestamps[i + 1]: timestamps[i] = timestamps[i + 1]
+        return timestamps, balances
+
+    def change_count(self) -> int:
+        return sum(self.daily[4::5]) + sum(self.hourly[4::5]) + len(self.raw) // 2
+
+    def range_since(self, since: int) -> Optional[Tuple[int, int]]:
+        """(lowest, highest) balance recorded since the given time (whole buckets), or None."""
+        lows = [low for start, low in zip(self.daily[0::5], self.daily[2::5]) if start + 86400 > since]
+        lows += [low for start, low in zip(self.hourly[0::5], self.hourly[2::5]) if start + 3600 > since]
+        highs = [high for start, high in zip(self.daily[0::5], self.daily[3::5]) if start + 86400 > since]
+        highs += [high for start, high in zip(self.hourly[0::5], self.hourly[3::5]) if start + 3600 > since]
+        recent = [balance for ts, balance in zip(self.raw[0::2], self.raw[1::2]) if ts >= since]
+        if not lows and not recent: return None
+        return min(lows + recent), max(highs + recent)
+
+
+class CreditHistory:
+    """Per-user balance history, kept per server in HISTORY_DIR as a base file plus an append-only log.
+
+    Every change is logged as one (user_id, timestamp, balance) record, appended every
+    HISTORY_FLUSH_INTERVAL_SECONDS and on shutdown in a worker thread, so a flush costs what changed, not
+    what the server holds. Once a log outgrows its base file, the base is rewritten under the next
+    generation number and a fresh log is started. A server's history is only loaded by a query for it;
+    changes to a server that is not loaded are just queued for its log. Past HISTORY_CACHE_MAX_GUILDS servers
+    or HISTORY_CACHE_MAX_SERIES users the least recently used servers are unloaded, which writes nothing
+    since their changes are already logged or pending.
+    """
+
+    def __init__(self, directory: Optional[str]):
+        self.directory = directory
+        self._guilds = collections.OrderedDict() # guild_id -> {user_id: UserHistory}, least recently used first
+        self._pending = {} # guild_id -> array('q') of (user_id, timestamp, balance) records not in the log yet
+        self._pending_users = {} # guild_id -> user IDs with a record in _pending
+        self._files = {} # guild_id -> [generation, base file bytes, log bytes]
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _base_path(self, guild_id: int) -> str:
+        return os.path.join(self.directory, f"{guild_id}.bin")
+
+    def _log_path(self, guild_id: int, generation: int) -> str:
+        return os.path.join(self.directory, f"{guild_id}.{generation}.log")
+
+    def _guild(self, guild_id: int) -> dict:
+        series = self._guilds.get(guild_id)
+        if series is not None:
+            self._guilds.move_to_end(guild_id)
+            return series
+        with metrics.timer("socialcredit_storage_seconds", op="history_load"):
+            series = self._guilds[guild_id] = self._load(guild_id)
+        self._evict()
+        return series
+
+    def _evict(self):
+        series_count = self.series_count()
+        for guild_id in list(self._guilds)[:-1]:
+            if len(self._guilds) <= HISTORY_CACHE_MAX_GUILDS and series_count <= HISTORY_CACHE_MAX_SERIES: return
+            series_count -= len(self._guilds.pop(guild_id))
+
+    def _load(self, guild_id: int) -> dict:
+        series = {}; generation = 0; base_bytes = 0
+        path = self._base_path(guild_id)
+        if os.path.exists(path):
+            with open(path, "rb") as f: data = f.read()
+            base_bytes = len(data)
+            if data[:4] == HISTORY_FILE_MAGIC: (generation,) = _HISTORY_GENERATION.unpack_from(data, 4); offset = 4 + _HISTORY_GENERATION.size
+            elif data[:4] == b"SCH1": offset = 4 # Written before the log existed
+            else:
+                print(f"Ignoring unreadable credit history file {path}.")
+                offset = len(data)
+            view = memoryview(data)
+            while offset < len(data):
+                user_id, *lengths = _HISTORY_HEADER.unpack_from(data, offset); offset += _HISTORY_HEADER.size
+                arrays = []
+                for length in lengths:
+                    values = array("q"); values.frombytes(view[offset:offset + length * 8]); offset += length * 8
+                    arrays.append(values)
+                series[user_id] = UserHistory(*arrays)
+        log_path = self._log_path(guild_id, generation); records = array("q")
+        if os.path.exists(log_path):
+            with open(log_path, "rb") as f: data = f.read()
+            records.frombytes(data[:len(data) - len(data) % 24]) # A record torn by a crash is dropped
+        self._files[guild_id] = [generation, base_bytes, len(records) * 8]
+        records.extend(self._pending.get(guild_id, ())) # Not appended to the log yet
+        for user_id, timestamp, balance in zip(records[0::3], records[1::3], records[2::3]):
+            history = series.get(user_id)
+            if timestamp < 0: # A starting balance, recorded without knowing whether the user had history
+                if history is not None: continue
+                timestamp = -timestamp
+            if history is None: history = series[user_id] = UserHistory()
+            history.add(timestamp, balance)
+        return series
+
+    def _serialize(self, guild_id: int, generation: int) -> bytes:
+        parts = [HISTORY_FILE_MAGIC, _HISTORY_GENERATION.pack(generation)]
+        for user_id, history in self._guilds.get(guild_id, {}).items():
+            parts.append(_HISTORY_HEADER.pack(user_id, len(history.raw), len(history.hourly), len(history.daily)))
+            parts += (history.raw.tobytes(), history.hourly.tobytes(), history.daily.tobytes())
+        return b"".join(parts)
+
+    def _append(self, guild_id: int, generation: int, records: bytes):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._log_path(guild_id, generation), "ab") as f:
+            f.write(records); f.flush(); os.fsync(f.fileno())
+
+    def _write_base(self, guild_id: int, generation: int, data: bytes):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._base_path(guild_id); tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data); f.flush(); os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        # The new base holds everything the old generation's log did.
+        old_log = self._log_path(guild_id, generation - 1)
+        if os.path.exists(old_log): os.remove(old_log)
+
+    def record(self, guild_id: int, user_id: int, old_credits: int, new_credits: int):
+        # Called after the balance is committed, so a history failure must never reach the caller.
+        if not self.directory: return
+        try:
+            pending = self._pending.setdefault(guild_id, array("q"))
+            now = int(time.time())
+            series = self._guilds.get(guild_id) # Never loaded here: a change only queues records
+            if series is not None:
+                history = series.get(user_id)
+                if history is None:
+                    # The first change also records where the user started from.
+                    history = series[user_id] = UserHistory()
+                    history.add(now, old_credits); pending.extend((user_id, now, old_credits))
+                history.add(now, new_credits)
+            else:
+                users = self._pending_users.setdefault(guild_id, set())
+                if user_id not in users:
+                    # Whether the user already has history is only known once it is loaded, which then
+                    # keeps this starting balance (negative timestamp) only if it is their first record.
+                    users.add(user_id); pending.extend((user_id, -now, old_credits))
+            pending.extend((user_id, now, new_credits))
+        except Exception as e:
+            print(f"Error recording credit history for {user_id} on {guild_id}: {e}")
+
+    def get(self, guild_id: int, user_id: int) -> Optional[UserHistory]:
+        if not self.directory: return None
+        return self._guild(guild_id).get(user_id)
+
+    def forget_guild(self, guild_id: int):
+        self.flush_guild_sync(guild_id)
+        self._guilds.pop(guild_id, None); self._files.pop(guild_id, None)
+
+    def series_count(self) -> int:
+        return sum(map(len, self._guilds.values()))
+
+    def start(self):
+        if not self.directory or (self._task and not self._task.done()): return
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(HISTORY_FLUSH_INTERVAL_SECONDS)
+            try: await self.flush()
+            except Exception as e: print(f"Error saving credit history: {e}")
+
+    def _next_write(self, guild_id: int):
+        """Takes the guild's pending records and returns the file write that persists them, as (function, args)."""
+        records = self._pending.pop(guild_id, array("q")); self._pending_users.pop(guild_id, None)
+        if guild_id not in self._files: self._load_file_info(guild_id)
+        files = self._files[guild_id]
+        files[2] += len(records) * 8
+        if guild_id in self._guilds and files[2] > max(files[1], HISTORY_COMPACT_MIN_BYTES):
+            # Serialized here, between changes, so it includes the records just taken.
+            files[0] += 1; data = self._serialize(guild_id, files[0])
+            files[1] = len(data); files[2] = 0
+            return self._write_base, (guild_id, files[0], data)
+        return self._append, (guild_id, files[0], records.tobytes())
+
+    def _load_file_info(self, guild_id: int):
+        # For a server unloaded before its records were flushed: only the base file's generation is needed.
+        generation = 0; path = self._base_path(guild_id)
+        if os.path.exists(path):
+            with open(path, "rb") as f: header = f.read(4 + _HISTORY_GENERATION.size)
+            if header[:4] == HISTORY_FILE_MAGIC: (generation,) = _HISTORY_GENERATION.unpack_from(header, 4)
+        log_path = self._log_path(guild_id, generation)
+        self._files[guild_id] = [generation, os.path.getsize(path) if os.path.exists(path) else 0,
+                                 os.path.getsize(log_path) if os.path.exists(log_path) else 0]
+
+    async def flush(self):
+        if self._flush_lock is None: return self.flush_sync()
+        loop = asyncio.get_running_loop()
+        async with self._flush_lock:
+            for guild_id in [g for g, records in self._pending.items() if records]:
+                write, args = self._next_write(guild_id)
+                with metrics.timer("socialcredit_storage_seconds", op="history_flush"):
+                    await loop.run_in_executor(None, write, *args)
+
+    def flush_sync(self):
+        for guild_id in list(self._pending): self.flush_guild_sync(guild_id)
+
+    def flush_guild_sync(self, guild_id: int):
+        if self._pending.get(guild_id):
+            write, args = self._next_write(guild_id)
+            write(*args)
+
+    async def close(self):
+        if self._task: self._task.cancel()
+        await self.flush()
+
+
+credit_history = CreditHistory(HISTORY_DIR)
+
+def sparkline(values: List[int]) -> str:
+    low, high = min(values), max(values)
+    if high == low: return _SPARK_CHARS[3] * len(values)
+    return "".join(_SPARK_CHARS[(value - low) * (len(_SPARK_CHARS) - 1) // (high - low)] for value in values)
+
+def summarize_history(history: UserHistory, current_credits: int, now: int, days: int = 30) -> dict:
+    """Trend figures for the history command. Bounded work, whatever the number of recorded changes."""
+    timestamps, balances = history.points()
+    def balance_at(moment: int) -> Optional[int]:
+        i = bisect.bisect_right(timestamps, moment)
+        return balances[i - 1] if i else None
+    changes = {}
+    for label, seconds in (("24 hours", 86400), ("7 days", 7 * 86400), (f"{days} days", days * 86400)):
+        past = balance_at(now - seconds)
+        changes[label] = current_credits - (past if past is not None else balances[0])
+    day_closes = [balance_at(now - d * 86400) for d in range(days - 1, -1, -1)]
+    day_closes = [value for value in day_closes[:-1] if value is not None] + [current_credits]
+    low, high = history.range_since(now - days * 86400) or (current_credits, current_credits)
+    return {
+        "changes": changes, "low": min(low, current_credits), "high": max(high, current_credits),
+        "first_recorded": history.first_recorded(), "change_count": history.change_count(), "daily": day_closes,
+    }
+
+# --- Forbidden Word Matching ---
+# Characters folded onto the Latin letter they imitate. Everything is lowercased first.
+_HOMOGLYPHS = {
+    "а": "a", "в": "b", "е": "e", "ё": "e", "з": "3", "к": "k", "м": "m", "н": "h", "о": "o", "р": "p",
+    "с": "c", "т": "t", "у": "y", "х": "x", "і": "i", "ї": "i", "ј": "j", "ѕ": "s", "ԁ": "d", "ɡ": "g",
+    "α": "a", "β": "b", "ε": "e", "ι": "i", "κ": "k", "ν": "v", "ο": "o", "ρ": "p", "τ": "t", "υ": "u", "χ": "x",
+}
+_LEETSPEAK = {"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b", "@": "a", "$": "s", "€": "e", "|": "l"}
+_INVISIBLE = ["\u00ad", "\u034f", "\u180e", "\u200b", "\u200c", "\u200d", "\u200e", "\u200f", "\u2060", "\ufeff"]
+# Homoglyphs go through the leetspeak table too (e.g. Cyrillic "з" -> "3" -> "e").
+_NORMALIZE_TABLE = str.maketrans({
+    **{c: _LEETSPEAK.get(t, t) for c, t in _HOMOGLYPHS.items()},
+    **_LEETSPEAK,
+    **{c: None for c in _INVISIBLE},
+    **{chr(c): None for c in range(0x300, 0x370)}, # Combining accents left over from NFKD
+})
+_SEPARATORS_REGEX = re.compile(r"[\W_]+", re.UNICODE)
+_REPEATS_REGEX = re.compile(r"(.)\1+")
+_RUNS_REGEX = re.compile(r"(.)\1*")
+
+def normalize_text(text: str) -> str:
+    """Folds text into the form the word automaton matches against, using only C-level string passes.
+
+    Accents, zero-width characters, homoglyphs and leetspeak are folded away and runs of separators
+    become one space ("b4d  wörd" -> "bad word"). Repeated letters are kept; the automaton absorbs them.
+    """
+    text = unicodedata.normalize("NFKD", text).lower().translate(_NORMALIZE_TABLE)
+    return _SEPARATORS_REGEX.sub(" ", text)
+
+def _run_lengths(text: str) -> Tuple[int, ...]:
+    return tuple(len(m.group()) for m in _RUNS_REGEX.finditer(text))
+
+def _normalize_with_offsets(text: str) -> Tuple[str, List[int]]:
+    """Slow per-character version of normalize_text that remembers where each output character came from."""
+    out: List[str] = []; offsets: List[int] = []
+    for i, ch in enumerate(text):
+        for c in unicodedata.normalize("NFKD", ch).lower().translate(_NORMALIZE_TABLE):
+            if not c.isalnum(): c = " "
+            if c == " " and out and out[-1] == " ": continue
+            out.append(c); offsets.append(i)
+    return "".join(out), offsets
+
+
+class WordAutomaton:
+    """Aho-Corasick automaton over normalized terms. A scan costs one dict lookup per character, whatever the list size.
+
+    The automaton runs on text with repeated letters collapsed. A candidate match is then checked against the
+    letter runs of the terms themselves: every run in the text must be at least as long as the term's, so
+    "baaad" matches "bad" but a forbidden "ass" never matches "as".
+    """
+
+    def __init__(self, terms):
+        self.terms = sorted({t for t in (normalize_text(term).strip() for term in terms) if t})
+        self._runs = {} # collapsed term -> run lengths of every term that collapses to it
+        for term in self.terms:
+            self._runs.setdefault(_REPEATS_REGEX.sub(r"\1", term), []).append(_run_lengths(term))
+        goto: List[dict] = [{}]; term_lengths: List[Tuple[int, ...]] = [()]
+        for term in self._runs:
+            state = 0
+            for c in term:
+                if c not in goto[state]:
+                    goto.append({}); term_lengths.append(())
+                    goto[state][c] = len(goto) - 1
+                state = goto[state][c]
+            term_lengths[state] += (len(term),)
+
+        # Breadth-first pass: resolve failure links into direct transitions and inherit the outputs of the
+        # failure state. Transitions back to the root are left out; a missing key means "go to the root".
+        self.delta: List[dict] = [dict(goto[0])] + [None] * (len(goto) - 1)
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            transitions = dict(self.delta[fail[state]])
+            transitions.update(goto[state])
+            self.delta[state] = transitions
+            term_lengths[state] += term_lengths[fail[state]]
+            for c, child in goto[state].items():
+                fail[child] = self.delta[fail[state]].get(c, 0)
+                queue.append(child)
+        self.term_lengths = term_lengths
+
+        # Prefilter index: every term is filed under its rarest character, with the set of characters it needs.
+        char_counts = collections.Counter(c for term in self.terms for c in set(term))
+        self._required = {}
+        for term in self.terms:
+            chars = frozenset(term) - {" "}
+            self._required.setdefault(min(chars, key=lambda c: (char_counts[c], c)), []).append(chars)
+
+    def might_match(self, text: str) -> bool:
+        """Cheap check that is only False when text cannot contain any term.
+
+        For ASCII text the normalized characters are just the translated ones, so a term can only match
+        if all of its characters are present. NFKD can turn other characters into anything, so non-ASCII
+        text always goes on to the full scan.
+        """
+        if not self.terms: return False
+        if not text.isascii(): return True
+        present = set(text.lower().translate(_NORMALIZE_TABLE))
+        return any(chars <= present for c in present.intersection(self._required) for chars in self._required[c])
+
+    def search(self, normalized: str) -> Optional[Tuple[int, int]]:
+        """Returns (start, end) of the first whole-word match in normalized text, or None."""
+        collapsed = _REPEATS_REGEX.sub(r"\1", normalized)
+        delta = self.delta; term_lengths = self.term_lengths; last = len(collapsed) - 1
+        runs = None # Run lengths of the text, only worked out once a candidate turns up
+        state = 0
+        for i, c in enumerate(collapsed):
+            state = delta[state].get(c, 0)
+            if term_lengths[state] and (i == last or collapsed[i + 1] == " "):
+                for length in term_lengths[state]:
+                    start = i - length + 1
+                    if start and collapsed[start - 1] != " ": continue
+                    if runs is None: runs = _run_lengths(normalized)
+                    text_runs = runs[start:i + 1]
+                    if any(all(map(operator.le, term_runs, text_runs)) for term_runs in self._runs[collapsed[start:i + 1]]):
+                        return sum(runs[:start]), sum(runs[:i + 1])
+        return None
+
+    def find(self, text: str) -> Optional[str]:
+        """Returns the offending part of the original text, or None if it is clean."""
+        if not self.terms or not self.search(normalize_text(text)): return None
+        normalized, offsets = _normalize_with_offsets(text)
+        span = self.search(normalized)
+        if not span: return text.strip()[:100]
+        return text[offsets[span[0]]:offsets[span[1] - 1] + 1]
+
+
+class ForbiddenWordRegistry:
+    """Per-server forbidden word lists on top of FORBIDDEN_WORDS, each with its own cached automaton."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.guild_terms = load_generic_data(path)
+        self._global_automaton = WordAutomaton(FORBIDDEN_WORDS)
+        self._automata = {}
+
+    def terms_for(self, guild_id: int) -> List[str]:
+        return self.guild_terms.get(str(guild_id), [])
+
+    def automaton_for(self, guild_id: int) -> WordAutomaton:
+        guild_terms = self.guild_terms.get(str(guild_id))
+        if not guild_terms: return self._global_automaton
+        automaton = self._automata.get(guild_id)
+        if automaton is None:
+            automaton = self._automata[guild_id] = WordAutomaton(FORBIDDEN_WORDS + guild_terms)
+        return automaton
+
+    def find(self, guild_id: int, text: str) -> Optional[str]:
+        return self.automaton_for(guild_id).find(text)
+
+    def add_term(self, guild_id: int, term: str) -> bool:
+        term = term.strip(); normalized = normalize_text(term).strip()
+        if not normalized or any(normalize_text(t).strip() == normalized for t in self.terms_for(guild_id)): return False
+        self.guild_terms.setdefault(str(guild_id), []).append(term)
+        self._changed(guild_id)
+        return True
+
+    def remove_term(self, guild_id: int, term: str) -> bool:
+        """Removes every listed spelling that normalizes to the same form as term."""
+        normalized = normalize_text(term).strip()
+        guild_terms = self.terms_for(guild_id)
+        remaining = [t for t in guild_terms if normalize_text(t).strip() != normalized]
+        if len(remaining) == len(guild_terms): return False
+        if remaining: self.guild_terms[str(guild_id)] = remaining
+        else: del self.guild_terms[str(guild_id)]
+        self._changed(guild_id)
+        return True
+
+    def _changed(self, guild_id: int):
+        # Only this server's automaton is rebuilt, and only when it is next needed.
+        self._automata.pop(guild_id, None)
+        update_generic_data(self.path, str(guild_id), self.guild_terms.get(str(guild_id)))
+
+
+forbidden_words = ForbiddenWordRegistry(FORBIDDEN_WORDS_FILE)
+
+# --- Rank Tables ---
+class RankTable:
+    """One server's rank ladder. Thresholds are kept sorted, so a lookup is a single bisect."""
+
+    def __init__(self, ranks):
+        self.ranks = sorted(ranks, key=lambda rank: rank[0])
+        self.thresholds = [rank[0] for rank in self.ranks]
+        self.role_names = frozenset(rank[3] for rank in self.ranks if rank[3])
+        self._info = [(f"{icon} {display_name}", display_name, role_name) for _, display_name, icon, role_name in self.ranks]
+
+    def info(self, credits: int) -> Tuple[str, str, Optional[str]]:
+        # Credits below the lowest threshold still get the lowest rank.
+        return self._info[max(bisect.bisect_right(self.thresholds, credits) - 1, 0)]
+
+    def to_json(self) -> list:
+        return [[None if threshold == -float('inf') else threshold, display_name, icon, role_name]
+                for threshold, display_name, icon, role_name in self.ranks]
+
+    @classmethod
+    def from_json(cls, rows: list) -> "RankTable":
+        return cls([(-float('inf') if threshold is None else threshold, display_name, icon, role_name)
+                    for threshold, display_name, icon, role_name in rows])
+
+
+DEFAULT_RANK_TABLE = RankTable(SOCIAL_RANKS)
+
+class RankRegistry:
+    """Per-server rank ladders (SOCIAL_RANKS unless a server configured its own) and a per-server
+    role name -> role ID index, kept fresh by the guild role events, so resolving a rank role is a dict lookup."""
+
+    def __init__(self, path: str, retired_path: str):
+        self.path = path; self.retired_path = retired_path
+        self.tables = {int(guild_id): RankTable.from_json(rows) for guild_id, rows in load_generic_data(path).items()}
+        # Role names a ladder change dropped. They still count as rank roles, so syncing takes them off members.
+        self.retired = {int(guild_id): set(names) for guild_id, names in load_generic_data(retired_path).items()}
+        self._role_ids = {} # guild_id -> {role name: role ID}
+
+    def table_for(self, guild_id: Optional[int]) -> RankTable:
+        return self.tables.get(guild_id, DEFAULT_RANK_TABLE)
+
+    def set_rank(self, guild_id: int, threshold: int, display_name: str, icon: str, role_name: Optional[str]):
+        """Adds a rank, or replaces the one at the same threshold. The first edit starts from the default ladder."""
+        ranks = [rank for rank in self.table_for(guild_id).ranks if rank[0] != threshold]
+        ranks.append((threshold, display_name, icon, role_name))
+        self._replace(guild_id, RankTable(ranks))
+
+    def remove_rank(self, guild_id: int, threshold: int) -> bool:
+        ranks = self.table_for(guild_id).ranks
+        remaining = [rank for rank in ranks if rank[0] != threshold]
+        if len(remaining) == len(ranks) or not remaining: return False # A ladder needs at least one rank
+        self._replace(guild_id, RankTable(remaining))
+        return True
+
+    def reset(self, guild_id: int) -> bool:
+        if guild_id not in self.tables: return False
+        self._replace(guild_id, None)
+        return True
+
+    def _replace(self, guild_id: int, table: Optional[RankTable]):
+        old_names = self.table_for(guild_id).role_names
+        if table is None: self.tables.pop(guild_id, None)
+        else: self.tables[guild_id] = table
+        new_names = self.table_for(guild_id).role_names
+        self._set_retired(guild_id, (self.retired.get(guild_id, set()) | old_names) - new_names)
+        update_generic_data(self.path, str(guild_id), table.to_json() if table else None)
+
+    def _set_retired(self, guild_id: int, names: set):
+        if names == self.retired.get(guild_id, set()): return
+        if names: self.retired[guild_id] = names
+        else: self.retired.pop(guild_id, None)
+        update_generic_data(self.retired_path, str(guild_id), sorted(names) or None)
+
+    def clear_retired(self, guild_id: int):
+        """Called once every cached member was resynced, so the retired names no longer count as rank roles."""
+        self._set_retired(guild_id, set())
+
+    def index_guild(self, guild: disnake.Guild):
+        role_ids = {}
+        for role in guild.roles: role_ids.setdefault(role.name, role.id) # Like disnake.utils.get, the first match wins
+        self._role_ids[guild.id] = role_ids
+
+    def forget_guild(self, guild_id: int):
+        self._role_ids.pop(guild_id, None)
+
+    def role_id_for(self, guild: disnake.Guild, role_name: Optional[str]) -> Optional[int]:
+        if not role_name: return None
+        role_ids = self._role_ids.get(guild.id)
+        if role_ids is None:
+            self.index_guild(guild); role_ids = self._role_ids[guild.id]
+        return role_ids.get(role_name)
+
+    def role_for(self, guild: disnake.Guild, role_name: Optional[str]) -> Optional[disnake.Role]:
+        role_id = self.role_id_for(guild, role_name)
+        return guild.get_role(role_id) if role_id else None
+
+    def member_rank_role_ids(self, member: disnake.Member) -> List[int]:
+        """IDs of the rank roles (current or retired) the member holds, checked against the member's sorted role ID list."""
+        guild = member.guild; held = []
+        for role_name in self.table_for(guild.id).role_names | self.retired.get(guild.id, frozenset()):
+            role_id = self.role_id_for(guild, role_name)
+            if role_id and member._roles.has(role_id): held.append(role_id)
+        return held
+
+
+ranks = RankRegistry(RANK_TABLES_FILE, RETIRED_RANK_ROLES_FILE)
+
+def get_social_rank_info(credits: int, guild_id: Optional[int] = None) -> Tuple[str, str, Optional[str]]:
+    return ranks.table_for(guild_id).info(credits)
+
+
+# --- Outbound Notifications ---
+NOTIFY_MAX_CONCURRENCY = 4 # Queued Discord requests sent in parallel
+NOTIFY_QUEUE_LIMIT = 2000 # Past this many queued requests, new channel messages and DMs are dropped
+DIGEST_WINDOW_SECONDS = 5.0 # Violations in one channel within this window are merged into one digest embed
+
+# Lower numbers are sent first.
+PRIORITY_DELETE = 0
+PRIORITY_MODERATION = 1
+PRIORITY_CHANNEL = 2
+PRIORITY_DM = 3
+
+def build_violation_embed(user: disnake.Member, found_expression: str, penalty: int, new_credits: int, count: int = 1) -> disnake.Embed:
+    embed = disnake.Embed(
+        title="🇨🇳 IDEOLOGICAL SUBVERSION INTERCEPTED!",
+        description=(
+            f"Citizen {user.mention} used a hostile expression: **'{found_expression}'**"
+            + (".\n" if count == 1 else f" in {count} messages.\n") +
+            f"They are stripped of **{penalty}** Social Credits."
+        ),
+        color=EMBED_COLOR_SEVERE_WARNING
+    )
+    embed.add_field(name="Traitor's New Rating:", value=f"**{new_credits}** Social Credits")
+    embed.set_footer(text="The Party is vigilant! The enemy will not pass!")
+    return embed
+
+def build_violation_digest_embed(events: list) -> disnake.Embed:
+    lines = [f"{user.mention}: **'{found_expression}'**{f' ×{count}' if count > 1 else ''} (-{penalty}, now **{new_credits}**)"
+             for user, found_expression, penalty, new_credits, count in events[:20]]
+    if len(events) > 20: lines.append(f"...and {len(events) - 20} more.")
+    embed = disnake.Embed(
+        title=f"🇨🇳 IDEOLOGICAL SUBVERSION INTERCEPTED! ×{len(events)}",
+        description="Hostile expressions used by citizens:\n" + "\n".join(lines),
+        color=EMBED_COLOR_SEVERE_WARNING
+    )
+    embed.set_footer(text="The Party is vigilant! The enemy will not pass!")
+    return embed
+
+
+class NotificationDispatcher:
+    """Background queue for outbound Discord requests, so event handlers don't wait on them.
+
+    Requests are sent by NOTIFY_MAX_CONCURRENCY workers in priority order (deletes, then moderation
+    actions, then channel messages, then DMs). Violation announcements in a busy channel are merged:
+    the first one goes out straight away, the rest of the window's events become one digest embed.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: List[asyncio.Task] = []
+        self._seq = itertools.count() # Keeps equal priorities in FIFO order
+        self._digests = {} # channel_id -> (channel, violations waiting for the digest)
+        self.counters = {"enqueued": 0, "sent": 0, "failed": 0, "dropped": 0, "merged": 0}
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def stats(self) -> dict:
+        return {"queue_depth": self.queue_depth, "pending_digests": sum(len(events) for _, events in self._digests.values()), **self.counters}
+
+    def start(self):
+        if self._workers and not any(w.done() for w in self._workers): return
+        if self._queue is None: self._queue = asyncio.PriorityQueue()
+        loop = asyncio.get_running_loop()
+        self._workers = [loop.create_task(self._worker()) for _ in range(NOTIFY_MAX_CONCURRENCY)]
+
+    def submit(self, kind: str, factory, priority: int):
+        """Queues factory(), a zero-argument callable returning an awaitable, to run in the background."""
+        self.start()
+        if priority > PRIORITY_MODERATION and self._queue.qsize() >= NOTIFY_QUEUE_LIMIT:
+            self.counters["dropped"] += 1
+            return
+        self.counters["enqueued"] += 1
+        self._queue.put_nowait((priority, next(self._seq), kind, factory))
+
+    def send(self, target: disnake.abc.Messageable, content: Optional[str] = None, embed: Optional[disnake.Embed] = None):
+        """Queues a message to a channel, or a DM if target is a member or user."""
+        kwargs = {"embed": embed} if embed else {}
+        if isinstance(target, (disnake.Member, disnake.User)):
+            self.submit("dm", lambda: target.send(content, **kwargs), PRIORITY_DM)
+        else:
+            self.submit("channel", lambda: target.send(content, **kwargs), PRIORITY_CHANNEL)
+
+    def report_violation(self, channel: disnake.abc.Messageable, user: disnake.Member, found_expression: str, penalty: int, new_credits: int,
+                         count: int = 1):
+        event = (user, found_expression, penalty, new_credits, count)
+        if channel.id in self._digests:
+            self._digests[channel.id][1].append(event)
+            return
+        self._digests[channel.id] = (channel, [])
+        self.send(channel, embed=build_violation_embed(*event))
+        asyncio.get_running_loop().call_later(DIGEST_WINDOW_SECONDS, self._flush_digest, channel.id)
+
+    def _send_digest(self, channel: disnake.abc.Messageable, events: list):
+        if len(events) == 1:
+            self.send(channel, embed=build_violation_embed(*events[0]))
+        else:
+            self.counters["merged"] += len(events) - 1
+            self.send(channel, embed=build_violation_digest_embed(events))
+
+    def _flush_digest(self, channel_id: int):
+        if channel_id not in self._digests: return
+        channel, events = self._digests[channel_id]
+        if not events:
+            del self._digests[channel_id]
+            return
+        self._send_digest(channel, events)
+        # The channel is still busy, so keep collecting instead of announcing the next violation on its own.
+        self._digests[channel_id] = (channel, [])
+        asyncio.get_running_loop().call_later(DIGEST_WINDOW_SECONDS, self._flush_digest, channel_id)
+
+    async def _worker(self):
+        while True:
+            _, __, kind, factory = await self._queue.get()
+            try:
+                if kind == "moderation": await factory() # Its Discord requests are tracked one by one
+                else:
+                    with track_request(kind): await factory()
+                self.counters["sent"] += 1
+            except disnake.Forbidden:
+                # Closed DMs are routine; anything else means a missing permission.
+                self.counters["failed"] += 1
+                if kind != "dm": print(f"No permissions for queued {kind} request.")
+            except Exception as e:
+                self.counters["failed"] += 1
+                print(f"Error sending queued {kind} request: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def close(self, timeout: float = 10):
+        """Sends pending digests and waits (up to timeout seconds) for the queue to drain."""
+        if self._queue is None: return
+        for channel, events in self._digests.values():
+            if events: self._send_digest(channel, events)
+        self._digests.clear()
+        try: await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError: print(f"Shutting down with {self.queue_depth} notification(s) unsent.")
+        for worker in self._workers: worker.cancel()
+        self._workers = []
+
+
+notifier = NotificationDispatcher()
+
+# --- Rank Role Syncing ---
+ROLE_SYNC_DEBOUNCE_SECONDS = 2.0 # Credit changes for the same member within this window become one role edit
+ROLE_SYNC_MIN_INTERVAL_SECONDS = 0.5 # Minimum gap between role edits on one server
+
+class RoleSyncScheduler:
+    """Per-server queue that keeps members' rank roles in line with their credits.
+
+    Only the latest credit value per member is kept, so a burst of changes collapses into one
+    member.edit(roles=...) call, and members whose rank role is already right cost no request at all.
+    Edits on each server are spaced out and back off when Discord reports a rate limit.
+    """
+
+    def __init__(self):
+        self._pending = {} # guild_id -> {member_id: (member, credits, interaction, channel_to_notify)}
+        self._workers = {} # guild_id -> asyncio.Task
+        self.edits_applied = 0; self.edits_skipped = 0
+
+    @staticmethod
+    def desired_role_name(guild_id: int, credits_val: int) -> Optional[str]:
+        return get_social_rank_info(credits_val, guild_id)[2]
+
+    def pending_count(self, guild_id: int) -> int:
+        return len(self._pending.get(guild_id, {}))
+
+    def is_in_sync(self, member: disnake.Member, credits_val: int) -> bool:
+        desired_name = self.desired_role_name(member.guild.id, credits_val)
+        desired_id = ranks.role_id_for(member.guild, desired_name)
+        if desired_name and not desired_id: return False # Let _apply report the missing role
+        held = ranks.member_rank_role_ids(member)
+        return held == ([desired_id] if desired_id else [])
+
+    def schedule(self, member: disnake.Member, credits_val: int,
+                 interaction: Optional[disnake.ApplicationCommandInteraction] = None,
+                 channel_to_notify: Optional[disnake.TextChannel] = None):
+        guild_pending = self._pending.setdefault(member.guild.id, {})
+        if member.id not in guild_pending and self.is_in_sync(member, credits_val):
+            self.edits_skipped += 1
+            return
+        guild_pending[member.id] = (member, credits_val, interaction, channel_to_notify)
+        worker = self._workers.get(member.guild.id)
+        if worker is None or worker.done():
+            self._workers[member.guild.id] = asyncio.get_running_loop().create_task(self._guild_worker(member.guild))
+
+    async def _guild_worker(self, guild: disnake.Guild):
+        await asyncio.sleep(ROLE_SYNC_DEBOUNCE_SECONDS)
+        guild_pending = self._pending.get(guild.id, {})
+        while guild_pending:
+            member_id = next(iter(guild_pending))
+            member, credits_val, interaction, channel_to_notify = guild_pending.pop(member_id)
+            # Prefer the gateway's copy: it reflects role changes made since the member was queued.
+            member = guild.get_member(member_id) or member
+            try:
+                await self._apply(guild, member, credits_val, interaction, channel_to_notify)
+            except disnake.HTTPException as e:
+                if e.status == 429:
+                    retry_after = float(e.response.headers.get("Retry-After", 5))
+                    print(f"Rate limited while syncing rank roles on {guild.name}; retrying in {retry_after}s")
+                    guild_pending.setdefault(member_id, (member, credits_val, interaction, channel_to_notify))
+                    await asyncio.sleep(retry_after)
+                    continue
+                print(f"HTTP error syncing rank role for {member.display_name}: {e.status} - {e.text}")
+            except Exception as e:
+                print(f"Unexpected error syncing rank role for {member.display_name}: {e}")
+            await asyncio.sleep(ROLE_SYNC_MIN_INTERVAL_SECONDS)
+        self._pending.pop(guild.id, None)
+
+    async def _apply(self, guild: disnake.Guild, member: disnake.Member, credits_val: int,
+                     interaction: Optional[disnake.ApplicationCommandInteraction],
+                     channel_to_notify: Optional[disnake.TextChannel]):
+        if self.is_in_sync(member, credits_val):
+            self.edits_skipped += 1
+            return
+        desired_name = self.desired_role_name(guild.id, credits_val)
+        held = set(ranks.member_rank_role_ids(member))
+        new_roles = [role for role in member.roles if role.id not in held and not role.is_default()]
+        if desired_name:
+            desired_role = ranks.role_for(guild, desired_name)
+            if not desired_role:
+                await send_rank_error(f"Role '{desired_name}' not found on server {guild.name}!", interaction, channel_to_notify)
+                return
+            new_roles.append(desired_role)
+        try:
+            with track_request("role_edit"): await member.edit(roles=new_roles, reason=f"New social rank: {desired_name}")
+            self.edits_applied += 1
+        except disnake.Forbidden:
+            await send_rank_error(f"No permissions to assign role '{desired_name}' to {member.display_name} on {guild.name}. Check hierarchy.",
+                                  interaction, channel_to_notify)
 
-# --- Data Handling Functions ---
-def load_generic_data(filepath):
-    if not os.path.exists(filepath): return {}
+
+async def send_rank_error(err_msg: str, interaction: Optional[disnake.ApplicationCommandInteraction] = None,
+                          channel_to_notify: Optional[disnake.TextChannel] = None):
     try:
-        with open(filepath, "r", encoding="utf-8") as f: return json.load(f)
-    except json.JSONDecodeError:
-        print(f"JSON decoding error in {filepath}. Returning empty dictionary.")
-        return {}
+        if interaction and interaction.response.is_done(): await interaction.followup.send(err_msg, ephemeral=True)
+        elif interaction: await interaction.response.send_message(err_msg, ephemeral=True)
+        elif channel_to_notify: notifier.send(channel_to_notify, err_msg)
+    except disnake.HTTPException as e:
+        print(f"Could not report rank error: {e}")
+    print(err_msg)
 
-def save_generic_data(data, filepath):
-    with open(filepath, "w", encoding="utf-8") as f: json.dump(data, f, indent=4, ensure_ascii=False)
 
-def load_credits_data(): return load_generic_data(DATA_FILE)
-def save_credits_data(data): save_generic_data(data, DATA_FILE)
+role_sync = RoleSyncScheduler()
 
-def get_user_credits(guild_id: int, user_id: int) -> int:
-    data = load_credits_data()
-    return data.get(str(guild_id), {}).get(str(user_id), DEFAULT_CREDITS)
-
-def update_user_credits(guild_id: int, user_id: int, amount: int, add: bool = True) -> Tuple[int, int]:
-    data = load_credits_data()
-    guild_data = data.setdefault(str(guild_id), {})
-    old_credits = guild_data.get(str(user_id), DEFAULT_CREDITS)
-    new_val = old_credits + amount if add else amount
-    guild_data[str(user_id)] = new_val
-    save_credits_data(data)
-    return old_credits, new_val
-
-def load_forbidden_stats(): return load_generic_data(FORBIDDEN_STATS_FILE)
-def save_forbidden_stats(data): save_generic_data(data, FORBIDDEN_STATS_FILE)
-def update_forbidden_stats(guild_id: int, user_id: int, penalty: int):
-    stats = load_forbidden_stats()
-    guild_stats = stats.setdefault(str(guild_id), {})
-    user_stats = guild_stats.setdefault(str(user_id), {"count": 0, "deducted_credits": 0})
-    user_stats["count"] += 1; user_stats["deducted_credits"] += penalty
-    save_forbidden_stats(stats)
-
-def get_social_rank_info(credits: int) -> Tuple[str, str, Optional[str]]:
-    for threshold, display_name, icon, role_name in reversed(SOCIAL_RANKS):
-        if credits >= threshold: return f"{icon} {display_name}", display_name, role_name
-    default_rank = SOCIAL_RANKS[0]
-    return f"{default_rank[2]} {default_rank[1]}", default_rank[1], default_rank[3]
+MAX_DISCORD_TIMEOUT_SECONDS = 28 * 24 * 60 * 60 # Max Discord timeout (28 days)
+BOT_TIMEOUTS_FILE = "bot_timeouts.json" # Timeouts the bot applied itself, so it never lifts one a moderator set
+BOT_TIMEOUTS_RETENTION_SECONDS = 90 * 24 * 60 * 60 # How long an expired timeout is remembered, so it is not applied again
+BOT_TIMEOUTS_FLUSH_INTERVAL_SECONDS = 5 # Changes to BOT_TIMEOUTS_FILE are written in the background at most this often
+
+def timeout_seconds_for(credits_val: int) -> int:
+    """Timeout owed for a balance: 10 minutes per full -1000 credits, capped at Discord's maximum."""
+    if credits_val >= 0: return 0
+    return min(abs(credits_val) // 1000 * 10 * 60, MAX_DISCORD_TIMEOUT_SECONDS)
+
+
+class TimeoutLedger:
+    """End times of the timeouts the bot applied, per server, with the balance each was applied for.
+
+    A timeout a moderator set or changed since does not match its recorded end time, so the reconciliation
+    sweep leaves it alone. Expired entries are kept until the member is back in good standing, so a timeout
+    that already ran its course is not applied again for the same balance. Changes are written to the file by
+    a background task, in a worker thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.guilds = load_generic_data(path) # guild ID (str) -> {user ID (str): [until timestamp, credits]}
+        self._dirty = False
+        self._task: Optional[asyncio.Task] = None
+
+    def _entry(self, member: disnake.Member) -> Optional[Tuple[float, Optional[int]]]:
+        entry = self.guilds.get(str(member.guild.id), {}).get(str(member.id))
+        if entry is None: return None
+        return tuple(entry) if isinstance(entry, list) else (entry, None) # Files from before balances were recorded
+
+    def applied(self, member: disnake.Member, until: datetime.datetime, credits_val: int):
+        self.guilds.setdefault(str(member.guild.id), {})[str(member.id)] = [until.timestamp(), credits_val]
+        self._changed()
+
+    def lifted(self, member: disnake.Member):
+        """Forgets the member's timeout: lifted, or no longer owed."""
+        if self.guilds.get(str(member.guild.id), {}).pop(str(member.id), None) is not None: self._changed()
+
+    def is_ours(self, member: disnake.Member) -> bool:
+        entry = self._entry(member)
+        current = member._communication_disabled_until
+        return entry is not None and current is not None and abs(current.timestamp() - entry[0]) < 1
+
+    def covers(self, member: disnake.Member, credits_val: int) -> bool:
+        """Whether the bot already timed the member out for this balance or a worse one."""
+        entry = self._entry(member)
+        return entry is not None and (entry[1] is None or entry[1] <= credits_val)
+
+    def _changed(self):
+        self._dirty = True
+        if self._task is None: self.flush_sync() # Not started yet, so there is no loop to write it later
+
+    def _snapshot(self) -> dict:
+        """Drops entries past the retention period and copies the rest for writing. Runs on the loop."""
+        self._dirty = False
+        horizon = time.time() - BOT_TIMEOUTS_RETENTION_SECONDS
+        for guild_id, users in list(self.guilds.items()):
+            self.guilds[guild_id] = {user_id: entry for user_id, entry in users.items()
+                                     if (entry[0] if isinstance(entry, list) else entry) > horizon}
+            if not self.guilds[guild_id]: del self.guilds[guild_id]
+        return {guild_id: dict(users) for guild_id, users in self.guilds.items()} # Entries are replaced, never changed in place
+
+    def start(self):
+        if self._task and not self._task.done(): return
+        self._task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(BOT_TIMEOUTS_FLUSH_INTERVAL_SECONDS)
+            await self.flush()
+
+    async def flush(self):
+        if not self._dirty: return
+        try: await asyncio.get_running_loop().run_in_executor(None, save_generic_data, self._snapshot(), self.path)
+        except Exception as e:
+            self._dirty = True # Retried on the next pass
+            print(f"Error saving {self.path}: {e}")
+
+    def flush_sync(self):
+        if self._dirty: save_generic_data(self._snapshot(), self.path)
+
+    async def close(self):
+        if self._task: self._task.cancel()
+        await self.flush()
+
+
+timeout_ledger = TimeoutLedger(process_file(BOT_TIMEOUTS_FILE))
 
 
 async def manage_user_status_and_roles(
@@ -105,48 +2021,17 @@ async def manage_user_status_and_roles(
     channel_to_notify: Optional[disnake.TextChannel] = None
 ):
     """Manages roles and timeouts based on credit changes."""
-    # 1. Update roles
-    _, __, new_role_name_from_rank = get_social_rank_info(new_credits)
-    
-    all_rank_role_names = [r[3] for r in SOCIAL_RANKS if r[3]]
-    roles_to_remove_objs = [role for role in member.roles if role.name in all_rank_role_names and role.name != new_role_name_from_rank]
-
-    if roles_to_remove_objs:
-        try:
-            await member.remove_roles(*roles_to_remove_objs, reason="Social rank updated")
-        except disnake.Forbidden:
-            print(f"No permissions to remove old rank roles from {member.display_name} on server {guild.name}")
-        except disnake.HTTPException as e:
-            print(f"HTTP error removing roles from {member.display_name}: {e.status} - {e.text}")
-
-    if new_role_name_from_rank:
-        role_to_add_obj = disnake.utils.get(guild.roles, name=new_role_name_from_rank)
-        if role_to_add_obj:
-            if role_to_add_obj not in member.roles:
-                try:
-                    await member.add_roles(role_to_add_obj, reason=f"New social rank: {new_role_name_from_rank}")
-                except disnake.Forbidden:
-                    err_msg = f"No permissions to assign role '{new_role_name_from_rank}' to {member.display_name} on {guild.name}. Check hierarchy."
-                    if interaction and interaction.response.is_done(): await interaction.followup.send(err_msg, ephemeral=True)
-                    elif interaction: await interaction.response.send_message(err_msg, ephemeral=True)
-                    elif channel_to_notify: await channel_to_notify.send(err_msg)
-                    print(err_msg)
-                except disnake.HTTPException as e:
-                    print(f"HTTP error assigning role {new_role_name_from_rank} to {member.display_name}: {e.status} - {e.text}")
-        else:
-            err_msg = f"Role '{new_role_name_from_rank}' not found on server {guild.name}!"
-            if interaction and interaction.response.is_done(): await interaction.followup.send(err_msg, ephemeral=True)
-            elif interaction: await interaction.response.send_message(err_msg, ephemeral=True)
-            elif channel_to_notify: await channel_to_notify.send(err_msg)
-            print(err_msg)
+    # 1. Update roles (debounced and applied in the background)
+    role_sync.schedule(member, new_credits, interaction=interaction, channel_to_notify=channel_to_notify)
 
     # 2. Manage timeout based on credits
-    MAX_DISCORD_TIMEOUT_SECONDS = 28 * 24 * 60 * 60 # Max Discord timeout (28 days)
-
     if new_credits >= 0:
-        if member._communication_disabled_until and member._communication_disabled_until > disnake.utils.utcnow(): 
+        if not (member._communication_disabled_until and member._communication_disabled_until > disnake.utils.utcnow()):
+            timeout_ledger.lifted(member) # Any expired timeout of ours is no longer owed
+        else:
             try:
-                await member.timeout(until=None, reason="Social credit restored, timeout removed.")
+                with track_request("timeout"): await member.timeout(until=None, reason="Social credit restored, timeout removed.")
+                timeout_ledger.lifted(member)
                 rehab_msg_embed = disnake.Embed(
                     title="✅ AMNESTY: TIMEOUT LIFTED!",
                     description=(
@@ -155,23 +2040,19 @@ async def manage_user_status_and_roles(
                     ),
                     color=EMBED_COLOR_SUCCESS
                 )
-                _, __, current_positive_role_name = get_social_rank_info(new_credits)
+                _, __, current_positive_role_name = get_social_rank_info(new_credits, guild.id)
                 if current_positive_role_name:
-                    role_obj = disnake.utils.get(guild.roles, name=current_positive_role_name)
+                    role_obj = ranks.role_for(guild, current_positive_role_name)
                     if role_obj: rehab_msg_embed.add_field(name="New Citizen Status:", value=role_obj.mention)
 
                 if interaction and interaction.response.is_done(): await interaction.followup.send(embed=rehab_msg_embed)
                 elif interaction: await interaction.response.send_message(embed=rehab_msg_embed)
-                elif channel_to_notify: await channel_to_notify.send(embed=rehab_msg_embed)
+                elif channel_to_notify: notifier.send(channel_to_notify, embed=rehab_msg_embed)
             except disnake.Forbidden: print(f"Failed to lift timeout for {member.display_name}. Check permissions.")
             except Exception as e: print(f"Error lifting timeout for {member.display_name}: {e}")
     
     elif new_credits < 0:
-        num_negative_thousands = abs(new_credits) // 1000
-        calculated_timeout_seconds = 0
-        if num_negative_thousands > 0:
-            calculated_timeout_seconds = num_negative_thousands * 10 * 60 # 10 minutes per -1000 credits
-            calculated_timeout_seconds = min(calculated_timeout_seconds, MAX_DISCORD_TIMEOUT_SECONDS)
+        calculated_timeout_seconds = timeout_seconds_for(new_credits)
 
         if calculated_timeout_seconds > 0:
             potential_new_timeout_end_dt = disnake.utils.utcnow() + datetime.timedelta(seconds=calculated_timeout_seconds)
@@ -188,7 +2069,8 @@ async def manage_user_status_and_roles(
 
             if apply_or_update_timeout:
                 try:
-                    await member.timeout(until=potential_new_timeout_end_dt, reason=reason_for_timeout_update)
+                    with track_request("timeout"): await member.timeout(until=potential_new_timeout_end_dt, reason=reason_for_timeout_update)
+                    timeout_ledger.applied(member, potential_new_timeout_end_dt, new_credits)
                     timeout_minutes_display = calculated_timeout_seconds // 60
                     timeout_msg_embed = disnake.Embed(
                         title="🚫 TEMPORARY ISOLATION!",
@@ -198,52 +2080,804 @@ async def manage_user_status_and_roles(
                         ),
                         color=EMBED_COLOR_SEVERE_WARNING
                     )
-                    _, __, current_negative_role_name = get_social_rank_info(new_credits)
+                    _, __, current_negative_role_name = get_social_rank_info(new_credits, guild.id)
                     if current_negative_role_name:
-                        role_obj_embed = disnake.utils.get(guild.roles, name=current_negative_role_name)
+                        role_obj_embed = ranks.role_for(guild, current_negative_role_name)
                         if role_obj_embed: timeout_msg_embed.add_field(name="Assigned Shameful Status:", value=role_obj_embed.mention)
                     
                     if interaction and interaction.response.is_done(): await interaction.followup.send(embed=timeout_msg_embed)
                     elif interaction: await interaction.response.send_message(embed=timeout_msg_embed)
-                    elif channel_to_notify: await channel_to_notify.send(embed=timeout_msg_embed)
-                    
-                    try:
-                        dm_embed = disnake.Embed(
-                            title="🚨 ISOLATION FROM SOCIETY!",
-                            description=f"Comrade {member.name}, your social rating ({new_credits}) has led to isolation "
-                                        f"on server **{guild.name}** for **{timeout_minutes_display} minutes**.\n"
-                                        "The Party hopes for your swift correction.",
-                            color=EMBED_COLOR_SEVERE_WARNING
-                        )
-                        if current_negative_role_name:
-                             role_obj_dm = disnake.utils.get(guild.roles, name=current_negative_role_name)
-                             if role_obj_dm: dm_embed.add_field(name="Your Current Status:", value=role_obj_dm.name)
-                        await member.send(embed=dm_embed)
-                    except disnake.Forbidden: pass
+                    elif channel_to_notify: notifier.send(channel_to_notify, embed=timeout_msg_embed)
+
+                    dm_embed = disnake.Embed(
+                        title="🚨 ISOLATION FROM SOCIETY!",
+                        description=f"Comrade {member.name}, your social rating ({new_credits}) has led to isolation "
+                                    f"on server **{guild.name}** for **{timeout_minutes_display} minutes**.\n"
+                                    "The Party hopes for your swift correction.",
+                        color=EMBED_COLOR_SEVERE_WARNING
+                    )
+                    if current_negative_role_name:
+                         role_obj_dm = ranks.role_for(guild, current_negative_role_name)
+                         if role_obj_dm: dm_embed.add_field(name="Your Current Status:", value=role_obj_dm.name)
+                    notifier.send(member, embed=dm_embed)
                 except disnake.Forbidden:
                     err_msg = f"Failed to apply/update timeout for {member.display_name}. Check permissions and hierarchy."
                     if interaction and interaction.response.is_done(): await interaction.followup.send(err_msg, ephemeral=True)
                     elif interaction: await interaction.response.send_message(err_msg, ephemeral=True)
-                    elif channel_to_notify : await channel_to_notify.send(err_msg)
+                    elif channel_to_notify: notifier.send(channel_to_notify, err_msg)
                     print(err_msg)
                 except Exception as e:
                     print(f"Unexpected error applying/updating timeout for {member.display_name}: {e}")
 
+# --- Violation Bursts ---
+BURST_WINDOW_SECONDS = 3.0 # Further violations by the same member on a server within this window are handled together
+
+class ViolationAggregator:
+    """Collapses a member's burst of forbidden-word messages into one round of consequences.
+
+    The first violation is handled straight away. Violations by the same member on the same server
+    during the next BURST_WINDOW_SECONDS are collected and handled together when the window closes:
+    one bulk delete per channel, one credit update, one stats update, one announcement, one timeout
+    review and one DM. A member who keeps going is handled once per window.
+    """
+
+    def __init__(self):
+        self._bursts = {} # (guild_id, user_id) -> [(message, found_expression)] waiting for the window to close
+        self.collapsed = 0
+
+    def report(self, message: disnake.Message, found_expression: str):
+        key = (message.guild.id, message.author.id)
+        if key in self._bursts:
+            self._bursts[key].append((message, found_expression))
+            return
+        self._open(key)
+        self._punish([(message, found_expression)])
+
+    def _open(self, key: Tuple[int, int]):
+        self._bursts[key] = []
+        asyncio.get_running_loop().call_later(BURST_WINDOW_SECONDS, self._close, key)
+
+    def _close(self, key: Tuple[int, int]):
+        burst = self._bursts.pop(key, None)
+        if not burst: return
+        self._open(key) # Still going, so keep collecting
+        self.collapsed += len(burst) - 1
+        try: self._punish(burst)
+        except Exception as e: print(f"Error handling a burst of {len(burst)} violation(s): {e}")
+
+    def flush(self):
+        """Handles every collected violation now. Used on shutdown."""
+        for key in list(self._bursts):
+            burst = self._bursts.pop(key)
+            if burst: self._punish(burst)
+
+    @staticmethod
+    def _delete(messages: List[disnake.Message]):
+        by_channel = {}
+        for message in messages: by_channel.setdefault(message.channel.id, (message.channel, []))[1].append(message)
+        for channel, channel_messages in by_channel.values():
+            if len(channel_messages) == 1 or not hasattr(channel, "delete_messages"):
+                for message in channel_messages: notifier.submit("delete", message.delete, PRIORITY_DELETE)
+                continue
+            for i in range(0, len(channel_messages), 100): # Discord's limit per bulk delete
+                batch = channel_messages[i:i + 100]
+                notifier.submit("bulk_delete", lambda channel=channel, batch=batch: channel.delete_messages(batch), PRIORITY_DELETE)
+
+    def _punish(self, violations: List[Tuple[disnake.Message, str]]):
+        message = violations[-1][0]; user = message.author; guild = message.guild
+        messages = [m for m, _ in violations]; count = len(violations)
+        self._delete(messages)
+
+        penalty = FORBIDDEN_WORD_PENALTY * count
+        found_expression = ", ".join(dict.fromkeys(expression for _, expression in violations))[:200]
+        old_credits, new_credits = update_user_credits(guild.id, user.id, -penalty, add=True, reason="forbidden_word")
+        update_forbidden_stats(guild.id, user.id, penalty, reason="message:" + ",".join(str(m.id) for m in messages), count=count)
+
+        notifier.report_violation(message.channel, user, found_expression, penalty, new_credits, count=count)
+
+        notifier.submit("moderation", lambda: manage_user_status_and_roles(user, guild, old_credits, new_credits, channel_to_notify=message.channel),
+                        PRIORITY_MODERATION)
+
+        dm_embed = disnake.Embed(
+            title="🚨 SEVERE WARNING!",
+            description=(
+                (f"Comrade {user.name}, your message on server **'{guild.name}'** contained: `{found_expression}`.\n" if count == 1 else
+                 f"Comrade {user.name}, {count} of your messages on server **'{guild.name}'** contained: `{found_expression}`.\n")
+                + f"**{penalty}** Social Credits have been deducted from your account."
+            ),
+            color=EMBED_COLOR_ERROR
+        )
+        dm_embed.add_field(name="Your New Rating:", value=f"**{new_credits}** Social Credits")
+        notifier.send(user, embed=dm_embed)
+
+
+violation_bursts = ViolationAggregator()
+
+# --- Message Scanning ---
+SCAN_QUEUE_LIMIT = 1000 # Messages waiting to be scanned; past this, event handlers scan their message themselves
+SCAN_WORKERS = 4 # Coroutines taking messages off the scan queue
+SCAN_THREADS = 2 # Threads for scanning long texts off the event loop
+SCAN_INLINE_MAX_CHARS = 2000 # Texts up to this long are scanned on the loop; a thread hop would cost more
+SCAN_CACHE_SIZE = 4096 # Verdicts remembered by content hash, so copy-pasted spam is classified once
+
+def message_scan_text(message: disnake.Message) -> str:
+    """Everything in a message that members can read: content, embed text and attachment names."""
+    parts = [message.content]
+    for embed in message.embeds:
+        parts += [embed.title, embed.description, embed.author.name, embed.footer.text]
+        parts += [f"{field.name}\n{field.value}" for field in embed.fields]
+    parts += [attachment.filename for attachment in message.attachments]
+    return "\n".join(part for part in parts if part)
+
+
+class MessageScanner:
+    """Bounded queue between the gateway handlers and forbidden-word matching.
+
+    Each text is looked up by content hash first, then put through WordAutomaton.might_match, and only
+    then scanned in full: on the loop if it is short, in a worker thread if it is long. Verdicts are
+    applied back on the loop, and a message is punished at most once however often it is edited.
+
+    disnake runs every event in a task of its own, so waiting for room in a full queue would only pile up
+    parked tasks. When the queue is full, the event's task scans its message itself instead.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._verdicts = collections.OrderedDict() # (automaton, content hash) -> found expression or None
+        self._offloaded = {} # (automaton, content hash) -> future of a scan running in a thread
+        self._punished = collections.OrderedDict() # IDs of messages already reported
+        self.counters = {"scanned": 0, "cache_hits": 0, "prefiltered": 0, "offloaded": 0, "overflowed": 0}
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self):
+        if self._workers and not any(w.done() for w in self._workers): return
+        if self._queue is None: self._queue = asyncio.Queue(maxsize=SCAN_QUEUE_LIMIT)
+        if self._executor is None: self._executor = concurrent.futures.ThreadPoolExecutor(SCAN_THREADS, thread_name_prefix="scan")
+        loop = asyncio.get_running_loop()
+        self._workers = [loop.create_task(self._worker()) for _ in range(SCAN_WORKERS)]
+
+    async def submit(self, message: disnake.Message):
+        self.start()
+        try: self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.counters["overflowed"] += 1
+            try: await self._scan(message)
+            except Exception as e: print(f"Error scanning message {message.id}: {e}")
+
+    async def _worker(self):
+        while True:
+            message = await self._queue.get()
+            try: await self._scan(message)
+            except Exception as e: print(f"Error scanning message {message.id}: {e}")
+            finally: self._queue.task_done()
+
+    async def classify(self, guild_id: int, text: str) -> Optional[str]:
+        automaton = forbidden_words.automaton_for(guild_id)
+        # Keyed on the automaton itself, so verdicts made before a word list changed are never reused.
+        key = (automaton, hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest())
+        if key in self._verdicts:
+            self.counters["cache_hits"] += 1
+            self._verdicts.move_to_end(key)
+            return self._verdicts[key]
+        if not automaton.might_match(text):
+            self.counters["prefiltered"] += 1
+            found = None
+        elif len(text) <= SCAN_INLINE_MAX_CHARS:
+            found = automaton.find(text)
+        else:
+            # Copies of a long text that arrive while it is being scanned wait for the same result.
+            pending = self._offloaded.get(key)
+            if pending is None:
+                self.counters["offloaded"] += 1
+                pending = self._offloaded[key] = asyncio.get_running_loop().run_in_executor(self._executor, automaton.find, text)
+                pending.add_done_callback(lambda _: self._offloaded.pop(key, None))
+            else:
+                self.counters["cache_hits"] += 1
+            found = await asyncio.shield(pending)
+        self._verdicts[key] = found
+        if len(self._verdicts) > SCAN_CACHE_SIZE: self._verdicts.popitem(last=False)
+        return found
+
+    async def _scan(self, message: disnake.Message):
+        if message.id in self._punished: return
+        text = message_scan_text(message)
+        if not text: return
+        with metrics.timer("socialcredit_word_scan_seconds"):
+            found_expression = await self.classify(message.guild.id, text)
+        self.counters["scanned"] += 1
+        metrics.inc("socialcredit_messages_scanned_total")
+        if not found_expression: return
+        self._punished[message.id] = None
+        if len(self._punished) > SCAN_CACHE_SIZE: self._punished.popitem(last=False)
+        metrics.inc("socialcredit_violations_total")
+        violation_bursts.report(message, found_expression)
+
+    async def close(self, timeout: float = 10):
+        """Scans what is still queued (up to timeout seconds), then stops the workers and threads."""
+        if self._queue is not None:
+            try: await asyncio.wait_for(self._queue.join(), timeout=timeout)
+            except asyncio.TimeoutError: print(f"Shutting down with {self.queue_depth} message(s) unscanned.")
+        for worker in self._workers: worker.cancel()
+        self._workers = []
+        if self._executor: self._executor.shutdown(wait=False); self._executor = None
+
+
+scanner = MessageScanner()
+
+# --- Member Resolution ---
+MEMBER_NAME_TTL_SECONDS = 300 # Display names of members missing from the gateway cache are remembered this long
+DEPARTED_MEMBER_TTL_SECONDS = 3600 # Members known to have left are skipped without asking Discord for this long
+QUERY_MEMBERS_BATCH = 100 # Discord's limit for user IDs per member chunk request
+MEMBER_CACHE_MAX_ENTRIES = 50000 # Cap on each of the name and departed caches, oldest entries dropped first
+
+class MemberResolver:
+    """Turns user IDs into display names with as few Discord requests as possible.
+
+    Order of lookups: the gateway member cache, then a TTL cache of names and departed members,
+    and only then one query_members chunk request per QUERY_MEMBERS_BATCH misses.
+    """
+
+    def __init__(self):
+        # Oldest first: every entry lives for the same TTL, so expired ones are always at the front.
+        self._names = collections.OrderedDict() # (guild_id, user_id) -> (expires_at, display_name)
+        self._departed = collections.OrderedDict() # (guild_id, user_id) -> expires_at
+
+    def is_departed(self, guild_id: int, user_id: int) -> bool:
+        expires_at = self._departed.get((guild_id, user_id))
+        if expires_at is None: return False
+        if expires_at > time.monotonic(): return True
+        del self._departed[(guild_id, user_id)]
+        return False
+
+    def forget(self, guild_id: int, user_id: int):
+        self._names.pop((guild_id, user_id), None)
+        self._departed.pop((guild_id, user_id), None)
+
+    async def resolve(self, guild: disnake.Guild, user_ids: List[int]) -> dict:
+        """Returns {user_id: display_name} for the IDs that are still members of the guild."""
+        now = time.monotonic()
+        names = {}; misses = []
+        for user_id in user_ids:
+            if self.is_departed(guild.id, user_id): continue
+            member = guild.get_member(user_id)
+            if member: names[user_id] = member.display_name; continue
+            cached = self._names.get((guild.id, user_id))
+            if cached and cached[0] > now: names[user_id] = cached[1]
+            else: misses.append(user_id)
+
+        for i in range(0, len(misses), QUERY_MEMBERS_BATCH):
+            batch = misses[i:i + QUERY_MEMBERS_BATCH]
+            try:
+                with track_request("query_members"): found = await guild.query_members(user_ids=batch, limit=len(batch), cache=True)
+            except (asyncio.TimeoutError, disnake.HTTPException) as e:
+                # Unknown rather than departed: leave them out this time and ask again next time.
+                print(f"Error querying members on {guild.name}: {e}")
+                continue
+            now = time.monotonic()
+            for member in found:
+                names[member.id] = member.display_name
+                self._names[(guild.id, member.id)] = (now + MEMBER_NAME_TTL_SECONDS, member.display_name)
+                self._names.move_to_end((guild.id, member.id))
+            for user_id in set(batch) - {m.id for m in found}:
+                self._departed[(guild.id, user_id)] = now + DEPARTED_MEMBER_TTL_SECONDS
+                self._departed.move_to_end((guild.id, user_id))
+            self._prune(now)
+        return names
+
+    def _prune(self, now: float):
+        names = self._names; departed = self._departed
+        while names and (len(names) > MEMBER_CACHE_MAX_ENTRIES or next(iter(names.values()))[0] <= now): names.popitem(last=False)
+        while departed and (len(departed) > MEMBER_CACHE_MAX_ENTRIES or next(iter(departed.values())) <= now): departed.popitem(last=False)
+
+    async def resolve_ranked(self, guild: disnake.Guild, ranked, count: int) -> Tuple[list, int]:
+        """Takes entries from a ranked (user_id, value) iterator until count of them are current members.
+
+        Returns (user_id, value, display_name) tuples, and how many entries of ranked they used up (departed
+        members included), so a next page can continue from there. Entries are resolved count at a time,
+        so a few departed members near the top cost one extra chunk request rather than one each.
+        """
+        resolved = []; consumed = 0
+        ranked = iter(ranked)
+        while len(resolved) < count:
+            batch = []
+            for entry in ranked:
+                consumed += 1
+                if not self.is_departed(guild.id, entry[0]): batch.append((consumed, entry))
+                if len(batch) >= count: break
+            if not batch: break
+            names = await self.resolve(guild, [entry[0] for _, entry in batch])
+            for position, (user_id, value) in batch:
+                if user_id not in names: continue
+                resolved.append((user_id, value, names[user_id]))
+                if len(resolved) == count: return resolved, position
+        return resolved, consumed
+
+
+member_resolver = MemberResolver()
+
+# --- Leaderboard Pages ---
+LEADERBOARDS = ("credits", "violators") # Ranked by balance, and by forbidden-word count then total fines
+LEADERBOARD_PAGE_TTL_SECONDS = 300 # Cached pages are rebuilt at least this often, to pick up changed display names
+LEADERBOARD_BUTTON_PREFIX = "sc_board"
+
+class LeaderboardPage:
+    __slots__ = ("number", "next_start", "entries", "lowest", "has_next", "embed", "built_at")
+
+    def __init__(self, number: int, next_start: int, entries: list, lowest, has_next: bool, embed: disnake.Embed):
+        self.number = number; self.next_start = next_start; self.entries = entries
+        self.lowest = lowest; self.has_next = has_next; self.embed = embed
+        self.built_at = time.monotonic()
+
+
+def build_leaderboard_embed(guild: disnake.Guild, entries: list, first_position: int, page_size: int, board_empty: bool) -> disnake.Embed:
+    if board_empty:
+        return disnake.Embed(title="📋 Honor Roll is Empty", description="The Party awaits its heroes!", color=EMBED_COLOR_INFO)
+    embed = disnake.Embed(
+        title="🏆 Honor Roll of Loyal Party Members - " + (f"Top {page_size}" if first_position == 1 else f"#{first_position}-#{first_position + page_size - 1}"),
+        description=f"Citizens of server **{guild.name}** who the entire nation looks up to!",
+        color=EMBED_COLOR_PARTY
+    )
+    for rank_num, (user_id, credits_val, display_name) in enumerate(entries, start=first_position):
+        rank_text, _, __ = get_social_rank_info(credits_val, guild.id)
+        embed.add_field(name=f"#{rank_num} Comrade {display_name}", value=f"Rating: **{credits_val}**\nStatus: {rank_text}", inline=False)
+    if not entries: embed.description = "No citizens worthy of mention yet." if first_position == 1 else "No further citizens worthy of mention."
+    embed.set_footer(text="Glory to the Party! Glory to Labor!")
+    return embed
+
+def build_naughty_list_embed(guild: disnake.Guild, entries: list, first_position: int, page_size: int, board_empty: bool) -> disnake.Embed:
+    if board_empty:
+        return disnake.Embed(title="📜 List of Ideological Subversives is Empty", description="All citizens are loyal to the Party! This is pleasing.", color=EMBED_COLOR_SUCCESS)
+    embed = disnake.Embed(
+        title="🚫 Shameful List of Anti-Party Elements - " + (f"Top {page_size}" if first_position == 1 else f"#{first_position}-#{first_position + page_size - 1}"),
+        description=f"Citizens of server **{guild.name}** who have embarked on the path of betrayal:",
+        color=EMBED_COLOR_WARNING
+    )
+    for rank_num, (user_id, user_data, display_name) in enumerate(entries, start=first_position):
+        embed.add_field(
+            name=f"{rank_num}. Enemy of the People: {display_name}",
+            value=(f"🗣️ Caught in anti-Party agitation: **{user_data['count']}** time(s)\n"
+                   f"💸 Total fines: **{user_data['deducted_credits']}** Social Credits"),
+            inline=False
+        )
+    if not entries:
+        embed.description = "No ideological subversives detected. Keep it up, Comrades!"
+        embed.color = EMBED_COLOR_SUCCESS
+    embed.set_footer(text="The Party sees all. Retribution is inevitable.")
+    return embed
+
+def leaderboard_buttons(board: str, page_size: int, page: LeaderboardPage) -> list:
+    if page.number == 0 and not page.has_next: return []
+    custom_id = f"{LEADERBOARD_BUTTON_PREFIX}:{board}:{page_size}"
+    return [
+        disnake.ui.Button(label="⏮ Top", custom_id=f"{custom_id}:0:top", disabled=page.number == 0),
+        disnake.ui.Button(label="◀ Previous", custom_id=f"{custom_id}:{page.number - 1}:prev", disabled=page.number == 0),
+        disnake.ui.Button(label="Next ▶", custom_id=f"{custom_id}:{page.number + 1}:next", disabled=not page.has_next),
+    ]
+
+
+class LeaderboardPages:
+    """Rendered leaderboard and naughty list pages, per guild, board and page size.
+
+    Pages are built in order, each starting where the previous one stopped in the ranking (departed
+    members are skipped), and stay cached until a change could have moved them: a new score drops
+    the pages whose lowest score is at or below it, and every page after those.
+    """
+
+    def __init__(self):
+        self._pages = {} # (guild_id, board) -> {page_size: [LeaderboardPage, ...] from page 0 on}
+        self.hits = 0; self.builds = 0
+
+    def invalidate(self, guild_id: int, board: str, score=None):
+        """score is the higher of a user's old and new score on board. None drops all of the board's pages."""
+        for pages in self._pages.get((guild_id, board), {}).values():
+            for number, page in enumerate(pages):
+                # The last page is dropped by any change, since a user may have joined the board below it.
+                if score is None or page.lowest is None or not page.has_next or page.lowest <= score:
+                    del pages[number:]
+                    break
+
+    def forget_guild(self, guild_id: int):
+        for board in LEADERBOARDS: self._pages.pop((guild_id, board), None)
+
+    async def get(self, guild: disnake.Guild, board: str, page_size: int, number: int) -> LeaderboardPage:
+        """Returns page number (0-based), or the last page if the board is shorter."""
+        pages = self._pages.setdefault((guild.id, board), {}).setdefault(page_size, [])
+        expired_before = time.monotonic() - LEADERBOARD_PAGE_TTL_SECONDS
+        for n, page in enumerate(pages):
+            if page.built_at < expired_before:
+                del pages[n:]
+                break
+        if number < len(pages): self.hits += 1
+        while len(pages) <= number and not (pages and not pages[-1].has_next):
+            built = len(pages); start = pages[-1].next_start if pages else 0
+            page = await self._build(guild, board, page_size, built, start)
+            # A change while the page was built may have dropped cached pages; then it is built again from the right place.
+            if len(pages) == built and (pages[-1].next_start if pages else 0) == start: pages.append(page)
+        return pages[min(number, len(pages) - 1)]
+
+    async def _build(self, guild: disnake.Guild, board: str, page_size: int, number: int, start: int) -> LeaderboardPage:
+        self.builds += 1
+        fetch = store.top_credits if board == "credits" else store.top_violators
+        ranked = iter_ranked(lambda limit, offset: fetch(guild.id, limit, start + offset), page_size)
+        entries, consumed = await member_resolver.resolve_ranked(guild, ranked, page_size)
+        has_next = len(entries) == page_size and bool(fetch(guild.id, 1, start + consumed))
+        board_empty = start == 0 and not entries and not fetch(guild.id, 1)
+        if board == "credits":
+            lowest = entries[-1][1] if entries else None
+            embed = build_leaderboard_embed(guild, entries, number * page_size + 1, page_size, board_empty)
+        else:
+            lowest = (entries[-1][1]["count"], entries[-1][1]["deducted_credits"]) if entries else None
+            embed = build_naughty_list_embed(guild, entries, number * page_size + 1, page_size, board_empty)
+        return LeaderboardPage(number, start + consumed, entries, lowest, has_next, embed)
+
+
+leaderboard_pages = LeaderboardPages()
+
+def _collect_runtime_gauges():
+    gauges = [(f"socialcredit_notifier_{key}", {}, value) for key, value in notifier.stats().items()]
+    gauges.append(("socialcredit_role_sync_pending", {}, sum(map(len, role_sync._pending.values()))))
+    gauges.append(("socialcredit_role_sync_edits_applied", {}, role_sync.edits_applied))
+    gauges.append(("socialcredit_role_sync_edits_skipped", {}, role_sync.edits_skipped))
+    gauges.append(("socialcredit_violations_collapsed", {}, violation_bursts.collapsed))
+    gauges.append(("socialcredit_scan_queue_depth", {}, scanner.queue_depth))
+    gauges.extend((f"socialcredit_scan_{key}", {}, value) for key, value in scanner.counters.items())
+    gauges.append(("socialcredit_decay_balances_changed", {}, decay.balances_changed))
+    gauges.append(("socialcredit_reconcile_members_checked", {}, reconciler.members_checked))
+    gauges.append(("socialcredit_reconcile_roles_queued", {}, reconciler.roles_queued))
+    gauges.append(("socialcredit_reconcile_timeouts_changed", {}, reconciler.timeouts_changed))
+    gauges.append(("socialcredit_decay_members_handed_off", {}, decay.members_handed_off))
+    gauges.append(("socialcredit_leaderboard_page_hits", {}, leaderboard_pages.hits))
+    gauges.append(("socialcredit_leaderboard_page_builds", {}, leaderboard_pages.builds))
+    gauges.append(("socialcredit_history_series_loaded", {}, credit_history.series_count()))
+    gauges.extend((f"socialcredit_store_{key}", {}, value) for key, value in store.cache_stats().items())
+    return gauges
+
+metrics.add_collector(_collect_runtime_gauges)
+
+# --- Bulk Operations ---
+BULK_IMPORT_MAX_BYTES = 8 * 1024 * 1024 # Largest CSV accepted by /socialcredit admin import
+BULK_IMPORT_MAX_AMOUNT = 1_000_000 # Imported amounts must lie within ±this, like the amounts of the slash commands
+BULK_CSV_CHUNK_ROWS = 5000 # CSV rows parsed or written between yields to the event loop
+BULK_PROGRESS_INTERVAL_SECONDS = 10 # How often a bulk directive's response is updated while its role syncs drain
+
+_bulk_progress_tasks = set() # Keeps the progress reporters referenced until they finish
+
+def timeout_outdated(member: disnake.Member, credits_val: int) -> bool:
+    """Whether manage_user_status_and_roles would apply, extend or lift a timeout for this balance."""
+    if credits_val >= 0:
+        return bool(member._communication_disabled_until and member._communication_disabled_until > disnake.utils.utcnow())
+    return timeout_seconds_for(credits_val) > 0
+
+def hand_off_bulk_results(guild: disnake.Guild, results: List[Tuple[int, int, int]]) -> Tuple[int, int]:
+    """Queues follow-up work for the members of a bulk change whose standing actually changed.
+
+    Members whose rank role changed go to the role sync queue; members whose timeout needs attention
+    go through the full moderation path. Everyone else costs nothing. Returns (role syncs, timeout reviews).
+    """
+    table = ranks.table_for(guild.id)
+    role_syncs = timeout_reviews = 0
+    for user_id, old_credits, new_credits in results:
+        member = guild.get_member(user_id)
+        if member is None or member.bot: continue
+        if timeout_outdated(member, new_credits):
+            notifier.submit("moderation", lambda m=member, o=old_credits, n=new_credits: manage_user_status_and_roles(m, guild, o, n),
+                            PRIORITY_MODERATION)
+            timeout_reviews += 1
+        elif table.info(old_credits)[2] != table.info(new_credits)[2]:
+            role_sync.schedule(member, new_credits)
+            role_syncs += 1
+    return role_syncs, timeout_reviews
+
+async def _report_bulk_progress(inter: disnake.ApplicationCommandInteraction, embed: disnake.Embed):
+    # The original response can only be edited while the interaction token is valid (15 minutes).
+    while not inter.is_expired():
+        remaining = role_sync.pending_count(inter.guild.id)
+        embed.set_field_at(len(embed.fields) - 1, name="Role Sync Progress:",
+                           value=f"{remaining} member(s) still queued on this server" if remaining else "All rank roles are up to date.", inline=False)
+        try: await inter.edit_original_response(embed=embed)
+        except disnake.HTTPException as e:
+            print(f"Could not update bulk directive progress: {e}"); return
+        if not remaining: return
+        await asyncio.sleep(BULK_PROGRESS_INTERVAL_SECONDS)
+
+async def finish_bulk_directive(inter: disnake.ApplicationCommandInteraction, title: str, description: str,
+                                results: List[Tuple[int, int, int]], color: int):
+    """Hands the changed members off and keeps the deferred response updated until their role syncs are done."""
+    role_syncs, timeout_reviews = hand_off_bulk_results(inter.guild, results)
+    embed = disnake.Embed(title=title, description=description, color=color)
+    embed.add_field(name="Rank Changes:", value=f"{role_syncs} citizen(s)", inline=True)
+    embed.add_field(name="Timeout Reviews:", value=f"{timeout_reviews} citizen(s)", inline=True)
+    embed.add_field(name="Role Sync Progress:", value="Queued.", inline=False)
+    embed.set_footer(text=f"Directive executed by: Comrade {inter.author.display_name}", icon_url=inter.author.display_avatar.url)
+    task = asyncio.get_running_loop().create_task(_report_bulk_progress(inter, embed))
+    _bulk_progress_tasks.add(task); task.add_done_callback(_bulk_progress_tasks.discard)
+
+async def parse_credit_csv(data: bytes) -> Tuple[List[Tuple[int, int]], int, List[int]]:
+    """Parses user_id,credits rows. A header and malformed rows are skipped; rows whose amount is outside
+    ±BULK_IMPORT_MAX_AMOUNT are rejected. Returns (rows, skipped count, line numbers of the rejected rows)."""
+    rows = []; skipped = 0; rejected = []
+    reader = csv.reader(io.StringIO(data.decode("utf-8-sig", errors="replace")))
+    for line_number, row in enumerate(reader, start=1):
+        try: user_id, amount = int(row[0]), int(row[1])
+        except (IndexError, ValueError): skipped += 1
+        else:
+            if not 0 < user_id < 1 << 63: skipped += 1 # Not a Discord ID
+            elif abs(amount) <= BULK_IMPORT_MAX_AMOUNT: rows.append((user_id, amount))
+            else: rejected.append(line_number)
+        if line_number % BULK_CSV_CHUNK_ROWS == 0: await asyncio.sleep(0)
+    return rows, skipped, rejected
+
+async def write_credit_csv(guild_id: int, fp) -> int:
+    """Streams a guild's balances as user_id,credits rows into a binary file. Returns the row count."""
+    buffer = io.StringIO(); writer = csv.writer(buffer)
+    writer.writerow(["user_id", "credits"]); count = 0
+    for user_id, credits_val in store.iter_credits(guild_id):
+        writer.writerow([user_id, credits_val]); count += 1
+        if count % BULK_CSV_CHUNK_ROWS == 0:
+            fp.write(buffer.getvalue().encode("utf-8")); buffer.seek(0); buffer.truncate()
+            await asyncio.sleep(0)
+    fp.write(buffer.getvalue().encode("utf-8"))
+    return count
+
+# --- Credit Decay ---
+DECAY_INTERVAL_SECONDS = 3600 # How often balances are swept. None disables decay and regeneration.
+DECAY_RATE_PER_DAY = 0.0 # Share of the distance to DEFAULT_CREDITS that every balance loses per day, e.g. 0.02
+REGEN_CREDITS_PER_DAY = 0 # Points per day that balances below DEFAULT_CREDITS regenerate (never past it)
+DECAY_STATE_FILE = "decay_state.json"
+
+class CreditDecayScheduler:
+    """Applies the decay/regeneration policy to every balance of every server once per DECAY_INTERVAL_SECONDS.
+
+    Each server is one store.decay_credits() call (a single pass over its balances as array columns),
+    and only members who crossed a rank threshold or climbed out of the negatives are handed to
+    manage_user_status_and_roles. The time of the last sweep survives restarts, so downtime is caught up.
+    """
+
+    def __init__(self, state_path: str):
+        self.state_path = state_path
+        state = load_generic_data(state_path)
+        self.last_sweep: Optional[float] = state.get("last_sweep")
+        self._regen_carry = state.get("regen_carry", 0.0) # Fractional regeneration not yet applied
+        self._task: Optional[asyncio.Task] = None
+        self.balances_changed = 0; self.members_handed_off = 0
+
+    def start(self, client: commands.Bot):
+        if not DECAY_INTERVAL_SECONDS or not (DECAY_RATE_PER_DAY or REGEN_CREDITS_PER_DAY): return
+        if self._task and not self._task.done(): return
+        self._task = asyncio.get_running_loop().create_task(self._loop(client))
+
+    async def close(self):
+        if self._task: self._task.cancel()
+
+    async def _loop(self, client: commands.Bot):
+        if self.last_sweep is None: self._save(time.time()) # First start: decay counts from now
+        while True:
+            await asyncio.sleep(max(0.0, self.last_sweep + DECAY_INTERVAL_SECONDS - time.time()))
+            try: await self.sweep(client.guilds)
+            except Exception as e:
+                print(f"Error in the credit decay sweep: {e}")
+                self._save(time.time())
+
+    def _save(self, swept_at: float):
+        self.last_sweep = swept_at
+        save_generic_data({"last_sweep": swept_at, "regen_carry": self._regen_carry}, self.state_path)
+
+    async def sweep(self, guilds):
+        now = time.time()
+        days = max(0.0, now - self.last_sweep) / 86400 if self.last_sweep else DECAY_INTERVAL_SECONDS / 86400
+        factor = (1 - DECAY_RATE_PER_DAY) ** days
+        self._regen_carry += REGEN_CREDITS_PER_DAY * days
+        regen = int(self._regen_carry); self._regen_carry -= regen
+        for guild in guilds:
+            self.sweep_guild(guild, factor, regen)
+            await asyncio.sleep(0) # Let other events run between servers
+        self._save(now)
+
+    def sweep_guild(self, guild: disnake.Guild, factor: float, regen: int) -> Tuple[int, int]:
+        """Returns (balances changed, members handed to manage_user_status_and_roles)."""
+        with metrics.timer("socialcredit_storage_seconds", op="decay"):
+            user_ids, old_values, new_values = store.decay_credits(guild.id, factor, regen, reason="decay")
+        if user_ids: leaderboard_pages.invalidate(guild.id, "credits")
+        # Ranks are compared as bisect positions among the finite thresholds, a C-level map over each column.
+        rank_of = functools.partial(bisect.bisect_right, [t for t in ranks.table_for(guild.id).thresholds if t != -float('inf')])
+        negative = functools.partial(operator.gt, 0)
+        crossed = map(operator.or_, map(operator.ne, map(rank_of, old_values), map(rank_of, new_values)),
+                      map(operator.ne, map(negative, old_values), map(negative, new_values))) # Leaving the negatives may lift a timeout
+        handed_off = 0
+        for user_id, old_credits, new_credits in itertools.compress(zip(user_ids, old_values, new_values), crossed):
+            member = guild.get_member(user_id)
+            if member is None or member.bot: continue
+            notifier.submit("moderation", lambda m=member, o=old_credits, n=new_credits: manage_user_status_and_roles(m, guild, o, n),
+                            PRIORITY_MODERATION)
+            handed_off += 1
+        self.balances_changed += len(user_ids); self.members_handed_off += handed_off
+        return len(user_ids), handed_off
+
+
+decay = CreditDecayScheduler(process_file(DECAY_STATE_FILE))
+
+# --- Startup Reconciliation ---
+RECONCILE_ON_STARTUP = True # Fix rank roles and timeouts that drifted while the bot was offline
+RECONCILE_TIMEOUTS = True # Also apply/lift timeouts that disagree with the balance. False only fixes roles.
+RECONCILE_STATE_FILE = "reconcile_state.json" # Checkpoint, so a restart mid-sweep resumes instead of starting over
+RECONCILE_CHECKPOINT_EVERY = 500 # Members checked between checkpoints
+RECONCILE_TIMEOUT_INTERVAL_SECONDS = 0.5 # Minimum gap between timeout edits made by the sweep
+
+class ReconciliationSweep:
+    """Diffs every cached member's rank role and timeout against their balance and fixes only what differs.
+
+    Guilds are walked in ID order and their members in ID order, so the checkpoint (finished guilds plus
+    the last member ID reached in the current one) is all it takes to resume. Role fixes go through
+    role_sync; before each checkpoint the sweep waits for that guild's role queue to drain, so nothing
+    behind a checkpoint is left undone. Timeout fixes are made one at a time by the sweep itself.
+    """
+
+    def __init__(self, state_path: str):
+        self.state_path = state_path
+        self._task: Optional[asyncio.Task] = None
+        self.members_checked = 0; self.roles_queued = 0; self.timeouts_changed = 0
+
+    def start(self, client: commands.Bot):
+        # Once per process: on_ready also fires after reconnects, when nothing was missed.
+        if not RECONCILE_ON_STARTUP or self._task: return
+        self._task = asyncio.get_running_loop().create_task(self.run(client))
+
+    async def close(self):
+        if self._task: self._task.cancel()
+
+    def _checkpoint(self, state: dict):
+        save_generic_data(state, self.state_path)
+
+    async def run(self, client: commands.Bot):
+        state = load_generic_data(self.state_path)
+        if not state or state.get("finished_at"):
+            state = {"started_at": time.time(), "done": [], "guild_id": None, "after": 0}
+        else:
+            print(f"Resuming the reconciliation sweep: {len(state['done'])} server(s) already done.")
+        done = set(state["done"])
+        try:
+            for guild in sorted(client.guilds, key=lambda g: g.id):
+                if guild.id in done: continue
+                if state["guild_id"] != guild.id: state["guild_id"] = guild.id; state["after"] = 0
+                await self.reconcile_guild(guild, state)
+                state["done"].append(guild.id); state["guild_id"] = None; state["after"] = 0
+                self._checkpoint(state)
+            state["finished_at"] = time.time()
+            self._checkpoint(state)
+            print(f"Reconciliation sweep finished: {self.members_checked} member(s) checked, "
+                  f"{self.roles_queued} role fix(es), {self.timeouts_changed} timeout fix(es).")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Reconciliation sweep stopped: {e}")
+
+    async def reconcile_guild(self, guild: disnake.Guild, state: dict):
+        missing_roles = set()
+        # Members without a stored balance or a rank role have never been touched by the bot; skip them.
+        stored = {user_id for user_id, _ in store.iter_credits(guild.id)}
+        members = sorted((m for m in guild.members if not m.bot and m.id > state["after"]
+                          and (m.id in stored or ranks.member_rank_role_ids(m))), key=lambda m: m.id)
+        for count, member in enumerate(members, start=1):
+            credits_val = get_user_credits(guild.id, member.id)
+            desired_name = role_sync.desired_role_name(guild.id, credits_val)
+            if desired_name and ranks.role_id_for(guild, desired_name) is None:
+                missing_roles.add(desired_name) # Reported once below instead of once per member
+            elif not role_sync.is_in_sync(member, credits_val):
+                role_sync.schedule(member, credits_val); self.roles_queued += 1
+            if RECONCILE_TIMEOUTS and await self.reconcile_timeout(member, credits_val):
+                self.timeouts_changed += 1
+                await asyncio.sleep(RECONCILE_TIMEOUT_INTERVAL_SECONDS)
+            self.members_checked += 1
+            if count % RECONCILE_CHECKPOINT_EVERY == 0 or count == len(members):
+                await self._drain_roles(guild)
+                state["after"] = member.id
+                self._checkpoint(state)
+        if missing_roles: print(f"Reconciliation: role(s) {', '.join(sorted(missing_roles))} not found on server {guild.name}.")
+        ranks.clear_retired(guild.id) # Every holder of a retired rank role was just fixed
+
+    @staticmethod
+    async def _drain_roles(guild: disnake.Guild):
+        while role_sync.pending_count(guild.id): await asyncio.sleep(1)
+
+    @staticmethod
+    async def reconcile_timeout(member: disnake.Member, credits_val: int) -> bool:
+        """Lifts a timeout the bot applied to a member now in good standing, or times out a member who should be
+        but is not. Running timeouts are never shortened or extended. Returns whether a request was made."""
+        timed_out = bool(member._communication_disabled_until and member._communication_disabled_until > disnake.utils.utcnow())
+        seconds = timeout_seconds_for(credits_val)
+        if credits_val >= 0 and timed_out:
+            if not timeout_ledger.is_ours(member): return False # Set by a moderator for some other reason
+            until, reason = None, "Reconciliation: social credit restored, timeout removed."
+        elif credits_val >= 0:
+            timeout_ledger.lifted(member) # Any expired timeout of ours is no longer owed
+            return False
+        elif seconds and not timed_out:
+            if timeout_ledger.covers(member, credits_val): return False # Already served for this balance
+            until, reason = disnake.utils.utcnow() + datetime.timedelta(seconds=seconds), f"Reconciliation: negative social credit ({credits_val})."
+        else:
+            return False
+        while True:
+            try:
+                with track_request("timeout"): await member.timeout(until=until, reason=reason)
+                if until: timeout_ledger.applied(member, until, credits_val)
+                else: timeout_ledger.lifted(member)
+                return True
+            except disnake.HTTPException as e:
+                if e.status != 429:
+                    print(f"Reconciliation could not update the timeout of {member.display_name}: {e.status} - {e.text}")
+                    return True
+                await asyncio.sleep(float(e.response.headers.get("Retry-After", 5)))
+
+
+reconciler = ReconciliationSweep(process_file(RECONCILE_STATE_FILE))
+
+_rank_resyncs = {} # guild_id -> asyncio.Task
+
+async def _resync_rank_roles(guild: disnake.Guild):
+    stored = dict(store.iter_credits(guild.id))
+    for count, member in enumerate(guild.members, start=1):
+        if not member.bot and (member.id in stored or ranks.member_rank_role_ids(member)):
+            role_sync.schedule(member, stored.get(member.id, DEFAULT_CREDITS)) # Free for members already in sync
+        if count % 1000 == 0: await asyncio.sleep(0) # Large servers: let other events through
+    while role_sync.pending_count(guild.id): await asyncio.sleep(1)
+    ranks.clear_retired(guild.id)
+
+def resync_rank_roles(guild: disnake.Guild):
+    """After a ladder change: gives every cached member the rank role the new ladder calls for and takes
+    away roles the ladder dropped. A later change restarts the resync, so no retired name is cleared early."""
+    running = _rank_resyncs.get(guild.id)
+    if running: running.cancel()
+    _rank_resyncs[guild.id] = asyncio.get_running_loop().create_task(_resync_rank_roles(guild))
+
 # --- Bot Initialization ---
 intents = disnake.Intents.default()
 intents.members = True
 intents.message_content = True
 
-bot = commands.Bot(command_prefix=commands.when_mentioned_or("!sc "), # You can change this prefix
-                   intents=intents,
-                   activity=disnake.Activity(type=disnake.ActivityType.watching, name="over the citizens"),
-                   status=disnake.Status.online)
+class SocialCreditBot(commands.AutoShardedBot if SHARD_COUNT else commands.Bot):
+    async def close(self):
+        # Make sure nothing pending in the notification queue or the credit store is lost on shutdown.
+        await metrics.close()
+        try: await scanner.close()
+        except Exception as e: print(f"Error finishing message scans on shutdown: {e}")
+        try: violation_bursts.flush()
+        except Exception as e: print(f"Error handling collected violations on shutdown: {e}")
+        await decay.close()
+        await reconciler.close()
+        await timeout_ledger.close()
+        try: await notifier.close()
+        except Exception as e: print(f"Error draining notifications on shutdown: {e}")
+        try: await credit_history.close()
+        except Exception as e: print(f"Error saving credit history on shutdown: {e}")
+        try: await store.close()
+        except Exception as e: print(f"Error flushing social credit data on shutdown: {e}")
+        await super().close()
+
+bot = SocialCreditBot(command_prefix=commands.when_mentioned_or("!sc "), # You can change this prefix
+                      intents=intents,
+                      **({"shard_count": SHARD_COUNT, "shard_ids": SHARD_IDS} if SHARD_COUNT else {}),
+                      # Every shard process serves every command, but only the one with shard 0 registers them.
+                      command_sync_flags=commands.CommandSyncFlags.default() if not SHARD_IDS or 0 in SHARD_IDS else commands.CommandSyncFlags.none(),
+                      activity=disnake.Activity(type=disnake.ActivityType.watching, name="over the citizens"),
+                      status=disnake.Status.online)
 
 @bot.event
 async def on_ready():
     print(f"Bot {bot.user.name} is online and serving the Party!")
-    if not os.path.exists(DATA_FILE): save_credits_data({})
-    if not os.path.exists(FORBIDDEN_STATS_FILE): save_forbidden_stats({})
+    for guild in bot.guilds: ranks.index_guild(guild)
+    store.start()
+    notifier.start()
+    credit_history.start()
+    timeout_ledger.start()
+    scanner.start()
+    decay.start(bot)
+    reconciler.start(bot)
+    if METRICS_PORT: await metrics.start_server(METRICS_HOST, METRICS_PORT)
 
 @bot.event
 async def on_message(message: disnake.Message):
@@ -253,48 +2887,66 @@ async def on_message(message: disnake.Message):
     if not isinstance(message.author, disnake.Member):
         return 
 
-    user: disnake.Member = message.author 
-    guild = message.guild
+    # Scanned in the background; repeat offences within a burst are handled together.
+    await scanner.submit(message)
+    # await bot.process_commands(message) # For prefix-based commands
 
-    match = FORBIDDEN_PATTERN_REGEX.search(message.content)
-    if match:
-        found_expression = match.group(0)
-        
-        try: await message.delete()
-        except disnake.Forbidden: print(f"No permissions to delete message from {user.name} in {guild.name}/{message.channel.name}")
-        except Exception as e: print(f"Error deleting message: {e}")
+@bot.event
+async def on_message_edit(before: disnake.Message, after: disnake.Message):
+    if after.author.bot or not after.guild or not isinstance(after.author, disnake.Member):
+        return
+    # Also fires when Discord adds link previews; only rescan if the readable text changed.
+    if message_scan_text(before) != message_scan_text(after): await scanner.submit(after)
 
-        old_credits, new_credits = update_user_credits(guild.id, user.id, -FORBIDDEN_WORD_PENALTY, add=True)
-        update_forbidden_stats(guild.id, user.id, FORBIDDEN_WORD_PENALTY)
+@bot.event
+async def on_guild_join(guild: disnake.Guild):
+    ranks.index_guild(guild)
 
-        embed_channel = disnake.Embed(
-            title="🇨🇳 IDEOLOGICAL SUBVERSION INTERCEPTED!",
-            description=(
-                f"Citizen {user.mention} used a hostile expression: **'{found_expression}'**.\n"
-                f"They are stripped of **{FORBIDDEN_WORD_PENALTY}** Social Credits."
-            ),
-            color=EMBED_COLOR_SEVERE_WARNING
-        )
-        embed_channel.add_field(name="Traitor's New Rating:", value=f"**{new_credits}** Social Credits")
-        embed_channel.set_footer(text="The Party is vigilant! The enemy will not pass!")
-        await message.channel.send(embed=embed_channel)
+@bot.event
+async def on_guild_remove(guild: disnake.Guild):
+    ranks.forget_guild(guild.id)
+    leaderboard_pages.forget_guild(guild.id)
+    credit_history.forget_guild(guild.id)
+    if guild.id in _rank_resyncs: _rank_resyncs.pop(guild.id).cancel()
 
-        await manage_user_status_and_roles(user, guild, old_credits, new_credits, channel_to_notify=message.channel)
+@bot.event
+async def on_guild_role_create(role: disnake.Role):
+    ranks.index_guild(role.guild)
 
-        try:
-            dm_embed = disnake.Embed(
-                title="🚨 SEVERE WARNING!",
-                description=(
-                    f"Comrade {user.name}, your message on server **'{guild.name}'** contained: `{found_expression}`.\n"
-                    f"**{FORBIDDEN_WORD_PENALTY}** Social Credits have been deducted from your account."
-                ),
-                color=EMBED_COLOR_ERROR
-            )
-            dm_embed.add_field(name="Your New Rating:", value=f"**{new_credits}** Social Credits")
-            await user.send(embed=dm_embed)
-        except disnake.Forbidden: pass
-        return
-    # await bot.process_commands(message) # For prefix-based commands
+@bot.event
+async def on_guild_role_update(before: disnake.Role, after: disnake.Role):
+    if before.name != after.name: ranks.index_guild(after.guild)
+
+@bot.event
+async def on_guild_role_delete(role: disnake.Role):
+    ranks.index_guild(role.guild)
+
+@bot.event
+async def on_member_join(member: disnake.Member):
+    member_resolver.forget(member.guild.id, member.id)
+
+@bot.event
+async def on_member_remove(member: disnake.Member):
+    member_resolver.forget(member.guild.id, member.id)
+
+# --- Slash Command Timing ---
+_command_started = {} # interaction ID -> perf_counter() at invoke
+
+def _command_path(inter: disnake.ApplicationCommandInteraction) -> str:
+    parts = [inter.data.name]; options = inter.data.options
+    while options and options[0].type in (disnake.OptionType.sub_command_group, disnake.OptionType.sub_command):
+        parts.append(options[0].name); options = options[0].options
+    return " ".join(parts)
+
+@bot.before_slash_command_invoke
+async def _before_slash_command(inter: disnake.ApplicationCommandInteraction):
+    _command_started[inter.id] = time.perf_counter()
+
+@bot.after_slash_command_invoke
+async def _after_slash_command(inter: disnake.ApplicationCommandInteraction):
+    started = _command_started.pop(inter.id, None)
+    if started is not None:
+        metrics.histogram("socialcredit_slash_command_seconds", command=_command_path(inter)).observe(time.perf_counter() - started)
 
 # --- Slash Commands ---
 @bot.slash_command(name="socialcredit", description="Manage and view Social Credits.")
@@ -304,7 +2956,7 @@ async def social_credit(inter: disnake.ApplicationCommandInteraction): pass
 async def check_credits(inter: disnake.ApplicationCommandInteraction, user: Optional[disnake.Member] = None):
     target_user = user or inter.author
     credits_val = get_user_credits(inter.guild.id, target_user.id) # Renamed to avoid conflict
-    rank_text, _, rank_role_name = get_social_rank_info(credits_val)
+    rank_text, _, rank_role_name = get_social_rank_info(credits_val, inter.guild.id)
     embed = disnake.Embed(
         title=f"Citizen Social Profile: {target_user.display_name}",
         color=EMBED_COLOR_PARTY
@@ -312,9 +2964,11 @@ async def check_credits(inter: disnake.ApplicationCommandInteraction, user: Opti
     embed.set_thumbnail(url=target_user.display_avatar.url)
     embed.add_field(name="Party Rating:", value=f"**{credits_val}** Social Credits", inline=False)
     embed.add_field(name="Status in Society:", value=rank_text, inline=False)
+    position, ranked_total = get_credit_rank(inter.guild.id, target_user.id)
+    embed.add_field(name="Standing:", value=f"#{position} of {ranked_total} ranked citizens" if position else "Not yet ranked", inline=False)
     if rank_role_name:
-        actual_role = disnake.utils.get(target_user.roles, name=rank_role_name)
-        if actual_role:
+        actual_role = ranks.role_for(inter.guild, rank_role_name)
+        if actual_role and target_user._roles.has(actual_role.id):
             embed.add_field(name="Current Social Role:", value=actual_role.mention, inline=False)
     
     if target_user._communication_disabled_until and target_user._communication_disabled_until > disnake.utils.utcnow():
@@ -324,18 +2978,34 @@ async def check_credits(inter: disnake.ApplicationCommandInteraction, user: Opti
     embed.set_footer(text="Serve the Party faithfully and diligently!", icon_url=inter.guild.icon.url if inter.guild.icon else None)
     await inter.response.send_message(embed=embed)
 
+@social_credit.sub_command(name="history", description="Show how a citizen's Social Credit score has developed.")
+async def credit_history_cmd(inter: disnake.ApplicationCommandInteraction, user: Optional[disnake.Member] = None):
+    target_user = user or inter.author
+    credits_val = get_user_credits(inter.guild.id, target_user.id)
+    with metrics.timer("socialcredit_storage_seconds", op="history"):
+        history = credit_history.get(inter.guild.id, target_user.id)
+        summary = summarize_history(history, credits_val, int(time.time())) if history else None
+    embed = disnake.Embed(title=f"📈 Citizen Record: {target_user.display_name}", color=EMBED_COLOR_PARTY)
+    embed.add_field(name="Party Rating:", value=f"**{credits_val}** Social Credits", inline=False)
+    if summary is None:
+        embed.description = "The Party has no recorded changes for this citizen yet."
+    else:
+        embed.description = f"On record since <t:{summary['first_recorded']}:D>."
+        embed.add_field(name="Change:", value="\n".join(f"{label}: **{change:+}**" for label, change in summary["changes"].items()), inline=True)
+        embed.add_field(name="Last 30 Days:", value=f"Lowest: **{summary['low']}**\nHighest: **{summary['high']}**", inline=True)
+        embed.add_field(name="Daily Trend:", value=f"`{sparkline(summary['daily'])}`", inline=False)
+        embed.set_footer(text=f"{summary['change_count']} change(s) on record")
+    await inter.response.send_message(embed=embed)
+
 @social_credit.sub_command_group(name="admin", description="Administrative directives for Social Credits.")
 @commands.has_permissions(administrator=True)
 async def admin_credits(inter: disnake.ApplicationCommandInteraction): pass
 
 async def _admin_credit_operation(inter: disnake.ApplicationCommandInteraction, user: disnake.Member, amount: int, is_delta: bool, operation_title: str, operation_key: str):
-    if is_delta:
-        old_credits, new_credits = update_user_credits(inter.guild.id, user.id, amount, add=True)
-    else:
-        old_credits = get_user_credits(inter.guild.id, user.id)
-        _, new_credits = update_user_credits(inter.guild.id, user.id, amount, add=False)
+    old_credits, new_credits = update_user_credits(inter.guild.id, user.id, amount, add=is_delta,
+                                                   actor_id=inter.author.id, reason=f"admin_{operation_key}")
 
-    rank_text, _, __ = get_social_rank_info(new_credits)
+    rank_text, _, __ = get_social_rank_info(new_credits, inter.guild.id)
     
     desc_map = {
         "give": f"Citizen {user.mention} has been awarded **{abs(amount)}** Social Credits.",
@@ -363,15 +3033,13 @@ async def _admin_credit_operation(inter: disnake.ApplicationCommandInteraction,
     elif operation_key == "take": dm_action_text = f"**{abs(amount)}** have been deducted from your"
     elif operation_key == "set": dm_action_text = f"your rating has been set to **{amount}**"
     if dm_action_text:
-        try:
-            dm_embed = disnake.Embed(
-                title="🇨🇳 Attention from The Party!",
-                description=f"On server **{inter.guild.name}**, {dm_action_text} Social Credits.",
-                color=color_map[operation_key]
-            )
-            dm_embed.add_field(name="Your New Rating:", value=f"{new_credits} Social Credits")
-            await user.send(embed=dm_embed)
-        except disnake.Forbidden: pass
+        dm_embed = disnake.Embed(
+            title="🇨🇳 Attention from The Party!",
+            description=f"On server **{inter.guild.name}**, {dm_action_text} Social Credits.",
+            color=color_map[operation_key]
+        )
+        dm_embed.add_field(name="Your New Rating:", value=f"{new_credits} Social Credits")
+        notifier.send(user, embed=dm_embed)
 
 @admin_credits.sub_command(name="give", description="Award Social Credits to a citizen.")
 async def give_credits_cmd(inter: disnake.ApplicationCommandInteraction, user: disnake.Member, amount: commands.Range[int, 1, 1000000]):
@@ -385,73 +3053,169 @@ async def take_credits_cmd(inter: disnake.ApplicationCommandInteraction, user: d
 async def set_credits_cmd(inter: disnake.ApplicationCommandInteraction, user: disnake.Member, amount: int):
     await _admin_credit_operation(inter, user, amount, False, "⚙️ Citizen Rating Adjusted", "set")
 
+@admin_credits.sub_command(name="bulk", description="Give, take or set Social Credits for everyone with a role, or the whole server.")
+async def bulk_credits_cmd(inter: disnake.ApplicationCommandInteraction, operation: str = commands.Param(choices=["give", "take", "set"]),
+                           amount: commands.Range[int, -1000000, 1000000] = commands.Param(), role: Optional[disnake.Role] = None):
+    if operation != "set" and amount <= 0:
+        embed = disnake.Embed(title="⚠️ Invalid Order", description="Give and take need a positive amount.", color=EMBED_COLOR_ERROR)
+        await inter.response.send_message(embed=embed, ephemeral=True); return
+    await inter.response.defer(ephemeral=True)
+    members = [member for member in (role.members if role else inter.guild.members) if not member.bot]
+    value = -amount if operation == "take" else amount
+    results = update_credits_bulk(inter.guild.id, [(member.id, value) for member in members], add=operation != "set",
+                                  actor_id=inter.author.id, reason=f"admin_bulk_{operation}")
+    target = role.mention if role else "the whole server"
+    description = {
+        "give": f"**{amount}** Social Credits awarded to **{len(results)}** citizen(s) of {target}.",
+        "take": f"**{amount}** Social Credits deducted from **{len(results)}** citizen(s) of {target}.",
+        "set": f"Rating of **{len(results)}** citizen(s) of {target} set to **{amount}**.",
+    }[operation]
+    color = {"give": EMBED_COLOR_SUCCESS, "take": EMBED_COLOR_ERROR, "set": EMBED_COLOR_INFO}[operation]
+    await finish_bulk_directive(inter, "📦 Mass Directive Executed", description, results, color)
+
+@admin_credits.sub_command(name="export", description="Download this server's Social Credit balances as CSV.")
+async def export_credits_cmd(inter: disnake.ApplicationCommandInteraction):
+    await inter.response.defer(ephemeral=True)
+    with tempfile.TemporaryFile() as fp:
+        count = await write_credit_csv(inter.guild.id, fp)
+        fp.seek(0)
+        await inter.followup.send(f"📤 {count} balance(s) exported.", file=disnake.File(fp, filename=f"social_credits_{inter.guild.id}.csv"), ephemeral=True)
+
+@admin_credits.sub_command(name="import", description="Load Social Credit balances from a user_id,credits CSV.")
+async def import_credits_cmd(inter: disnake.ApplicationCommandInteraction, file: disnake.Attachment,
+                             mode: str = commands.Param(default="set", choices=["set", "add"])):
+    if file.size > BULK_IMPORT_MAX_BYTES:
+        embed = disnake.Embed(title="⚠️ Invalid Order", description=f"The file is larger than {BULK_IMPORT_MAX_BYTES // (1024 * 1024)} MB.", color=EMBED_COLOR_ERROR)
+        await inter.response.send_message(embed=embed, ephemeral=True); return
+    await inter.response.defer(ephemeral=True)
+    rows, skipped, rejected = await parse_credit_csv(await file.read())
+    results = update_credits_bulk(inter.guild.id, rows, add=mode == "add", actor_id=inter.author.id, reason=f"admin_import_{mode}")
+    description = f"**{len(results)}** balance(s) {'adjusted' if mode == 'add' else 'set'} from `{file.filename}`."
+    if skipped: description += f"\n{skipped} row(s) skipped (header or not `user_id,credits`)."
+    if rejected:
+        lines = ", ".join(map(str, rejected[:10])) + (", …" if len(rejected) > 10 else "")
+        description += f"\n{len(rejected)} row(s) rejected, amount outside ±{BULK_IMPORT_MAX_AMOUNT:,} (line {lines})."
+    await finish_bulk_directive(inter, "📥 Census Imported", description, results, EMBED_COLOR_INFO)
+
+@admin_credits.sub_command(name="forbid", description="Add a word or phrase to this server's forbidden list.")
+async def forbid_word_cmd(inter: disnake.ApplicationCommandInteraction, word: commands.String[str, 1, 100]):
+    if forbidden_words.add_term(inter.guild.id, word):
+        embed = disnake.Embed(title="🚫 Expression Outlawed", description=f"`{word}` is now forbidden on this server.", color=EMBED_COLOR_SEVERE_WARNING)
+    else:
+        embed = disnake.Embed(title="⚠️ Nothing Changed", description=f"`{word}` is already forbidden or contains no letters.", color=EMBED_COLOR_WARNING)
+    await inter.response.send_message(embed=embed, ephemeral=True)
+
+@admin_credits.sub_command(name="unforbid", description="Remove a word or phrase from this server's forbidden list.")
+async def unforbid_word_cmd(inter: disnake.ApplicationCommandInteraction, word: commands.String[str, 1, 100]):
+    if forbidden_words.remove_term(inter.guild.id, word):
+        embed = disnake.Embed(title="✅ Expression Rehabilitated", description=f"`{word}` is no longer forbidden on this server.", color=EMBED_COLOR_SUCCESS)
+    else:
+        embed = disnake.Embed(title="⚠️ Nothing Changed", description=f"`{word}` is not on this server's forbidden list.", color=EMBED_COLOR_WARNING)
+    await inter.response.send_message(embed=embed, ephemeral=True)
+
+@admin_credits.sub_command(name="forbidden", description="Show this server's forbidden words and phrases.")
+async def forbidden_list_cmd(inter: disnake.ApplicationCommandInteraction):
+    guild_terms = forbidden_words.terms_for(inter.guild.id)
+    listing = ", ".join(f"`{t}`" for t in guild_terms) if guild_terms else "None. Only the Party-wide list applies."
+    if len(listing) > 4000: listing = listing[:4000] + " …"
+    embed = disnake.Embed(title="📕 Forbidden Expressions", description=listing, color=EMBED_COLOR_INFO)
+    embed.set_footer(text=f"{len(guild_terms)} server-specific + {len(FORBIDDEN_WORDS)} Party-wide expression(s)")
+    await inter.response.send_message(embed=embed, ephemeral=True)
+
+@admin_credits.sub_command(name="rankset", description="Add or change a rank on this server's ladder.")
+async def rank_set_cmd(inter: disnake.ApplicationCommandInteraction, threshold: int, name: commands.String[str, 1, 100],
+                       icon: commands.String[str, 0, 20] = "", role: Optional[disnake.Role] = None):
+    ranks.set_rank(inter.guild.id, threshold, name, icon, role.name if role else None)
+    leaderboard_pages.invalidate(inter.guild.id, "credits") # Pages show each citizen's rank
+    resync_rank_roles(inter.guild)
+    embed = disnake.Embed(title="🏅 Rank Decreed", description=f"From **{threshold}** Social Credits, citizens are {icon} **{name}**"
+                          + (f" and receive {role.mention}." if role else "."), color=EMBED_COLOR_SUCCESS)
+    await inter.response.send_message(embed=embed, ephemeral=True)
+
+@admin_credits.sub_command(name="rankremove", description="Remove a rank from this server's ladder.")
+async def rank_remove_cmd(inter: disnake.ApplicationCommandInteraction, threshold: int):
+    if ranks.remove_rank(inter.guild.id, threshold):
+        leaderboard_pages.invalidate(inter.guild.id, "credits")
+        resync_rank_roles(inter.guild)
+        embed = disnake.Embed(title="✅ Rank Abolished", description=f"The rank starting at **{threshold}** Social Credits is gone.", color=EMBED_COLOR_SUCCESS)
+    else:
+        embed = disnake.Embed(title="⚠️ Nothing Changed", description=f"No rank starts at **{threshold}**, or it is the last one left.", color=EMBED_COLOR_WARNING)
+    await inter.response.send_message(embed=embed, ephemeral=True)
+
+@admin_credits.sub_command(name="rankreset", description="Restore the Party-wide rank ladder on this server.")
+async def rank_reset_cmd(inter: disnake.ApplicationCommandInteraction):
+    if ranks.reset(inter.guild.id):
+        leaderboard_pages.invalidate(inter.guild.id, "credits")
+        resync_rank_roles(inter.guild)
+        embed = disnake.Embed(title="✅ Ladder Restored", description="This server uses the Party-wide ranks again.", color=EMBED_COLOR_SUCCESS)
+    else:
+        embed = disnake.Embed(title="⚠️ Nothing Changed", description="This server already uses the Party-wide ranks.", color=EMBED_COLOR_WARNING)
+    await inter.response.send_message(embed=embed, ephemeral=True)
+
+@admin_credits.sub_command(name="ranks", description="Show this server's rank ladder.")
+async def rank_list_cmd(inter: disnake.ApplicationCommandInteraction):
+    lines = []
+    for threshold, display_name, icon, role_name in reversed(ranks.table_for(inter.guild.id).ranks):
+        role = ranks.role_for(inter.guild, role_name)
+        floor = "below all others" if threshold == -float('inf') else f"from {threshold}"
+        role_text = role.mention if role else (f"`{role_name}` (missing!)" if role_name else "no role")
+        lines.append(f"{icon} **{display_name}**: {floor} · {role_text}")
+    embed = disnake.Embed(title="🪜 Social Rank Ladder", description="\n".join(lines)[:4000], color=EMBED_COLOR_INFO)
+    embed.set_footer(text="Server-specific ladder" if inter.guild.id in ranks.tables else "Party-wide ladder")
+    await inter.response.send_message(embed=embed, ephemeral=True)
+
+
+@admin_credits.sub_command(name="stats", description="Show the bot's performance statistics.")
+async def stats_cmd(inter: disnake.ApplicationCommandInteraction):
+    def latency_line(label: str, hist: Histogram) -> str:
+        if not hist.count: return f"{label}: no data"
+        fmt = lambda seconds: "∞" if seconds == float("inf") else f"{seconds * 1000:g} ms"
+        return f"{label}: {hist.count}× · avg {hist.sum / hist.count * 1000:.2f} ms · p50 ≤ {fmt(hist.quantile(0.5))} · p95 ≤ {fmt(hist.quantile(0.95))}"
+
+    def section(name: str, label_key: str) -> str:
+        lines = [latency_line(dict(labels).get(label_key, "all"), hist)
+                 for (metric, labels), hist in sorted(metrics.histograms.items(), key=lambda item: item[0]) if metric == name]
+        return "\n".join(lines) or "no data"
+
+    scanned = metrics.counters.get(("socialcredit_messages_scanned_total", ()), 0)
+    violations = metrics.counters.get(("socialcredit_violations_total", ()), 0)
+    failures = sum(v for (name, _), v in metrics.counters.items() if name == "socialcredit_discord_request_failures_total")
+    embed = disnake.Embed(title="📊 Ministry of Statistics Report", color=EMBED_COLOR_INFO)
+    embed.add_field(name="Word Scan", value=f"{scanned} message(s), {violations} violation(s)\n" + section("socialcredit_word_scan_seconds", "scan"), inline=False)
+    embed.add_field(name="Storage", value=section("socialcredit_storage_seconds", "op"), inline=False)
+    embed.add_field(name="Discord Requests", value=section("socialcredit_discord_request_seconds", "kind") + f"\nFailed: {failures}", inline=False)
+    embed.add_field(name="Slash Commands", value=section("socialcredit_slash_command_seconds", "command")[:1024], inline=False)
+    embed.add_field(name="Queues", value=(
+        "Notifications: " + ", ".join(f"{k} {v}" for k, v in notifier.stats().items()) + "\n"
+        f"Role sync: {sum(map(len, role_sync._pending.values()))} pending, {role_sync.edits_applied} applied, {role_sync.edits_skipped} skipped"
+    ), inline=False)
+    if METRICS_PORT: embed.set_footer(text=f"Prometheus endpoint: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    await inter.response.send_message(embed=embed, ephemeral=True)
+
 
 @social_credit.sub_command(name="leaderboard", description="Display the honor roll of model Party citizens.")
 async def leaderboard(inter: disnake.ApplicationCommandInteraction, top_n: commands.Range[int, 3, 20] = 10):
     await inter.response.defer()
-    data = load_credits_data()
-    guild_data = data.get(str(inter.guild.id), {})
-    if not guild_data:
-        embed = disnake.Embed(title="📋 Honor Roll is Empty", description="The Party awaits its heroes!", color=EMBED_COLOR_INFO)
-        await inter.followup.send(embed=embed); return
-
-    sorted_users_credits = sorted(guild_data.items(), key=lambda item: item[1], reverse=True)
-    embed = disnake.Embed(
-        title=f"🏆 Honor Roll of Loyal Party Members - Top {top_n}",
-        description=f"Citizens of server **{inter.guild.name}** who the entire nation looks up to!",
-        color=EMBED_COLOR_PARTY
-    )
-    rank_num = 1; displayed_users = 0
-    for user_id_str, credits_val_lb in sorted_users_credits: # Renamed credits_val to avoid conflict
-        if displayed_users >= top_n: break
-        try:
-            user_obj = await inter.guild.fetch_member(int(user_id_str))
-            if user_obj:
-                rank_text_lb, _, __ = get_social_rank_info(credits_val_lb) # Renamed rank_text
-                embed.add_field(name=f"#{rank_num} Comrade {user_obj.display_name}", value=f"Rating: **{credits_val_lb}**\nStatus: {rank_text_lb}", inline=False)
-                rank_num += 1; displayed_users +=1
-        except disnake.NotFound: continue
-        except Exception as e: print(f"Error in leaderboard: {e}"); continue
-    if displayed_users == 0: embed.description = "No citizens worthy of mention yet."
-    embed.set_footer(text="Glory to the Party! Glory to Labor!")
-    await inter.followup.send(embed=embed)
+    page = await leaderboard_pages.get(inter.guild, "credits", top_n, 0)
+    await inter.followup.send(embed=page.embed, components=leaderboard_buttons("credits", top_n, page))
 
 
 @social_credit.sub_command(name="naughtylist", description="List of citizens who have shown ideological instability.")
 async def naughty_list(inter: disnake.ApplicationCommandInteraction, top_n: commands.Range[int, 3, 20] = 10):
     await inter.response.defer()
-    stats_data = load_forbidden_stats()
-    guild_stats = stats_data.get(str(inter.guild.id), {})
-    if not guild_stats:
-        embed = disnake.Embed(title="📜 List of Ideological Subversives is Empty", description="All citizens are loyal to the Party! This is pleasing.", color=EMBED_COLOR_SUCCESS)
-        await inter.followup.send(embed=embed); return
+    page = await leaderboard_pages.get(inter.guild, "violators", top_n, 0)
+    await inter.followup.send(embed=page.embed, components=leaderboard_buttons("violators", top_n, page))
 
-    sorted_violators = sorted(guild_stats.items(), key=lambda item: (item[1]["count"], item[1]["deducted_credits"]), reverse=True)
-    embed = disnake.Embed(
-        title=f"🚫 Shameful List of Anti-Party Elements - Top {top_n}",
-        description=f"Citizens of server **{inter.guild.name}** who have embarked on the path of betrayal:",
-        color=EMBED_COLOR_WARNING
-    )
-    displayed_count = 0
-    for user_id_str, user_data in sorted_violators:
-        if displayed_count >= top_n: break
-        try:
-            user_obj = await inter.guild.fetch_member(int(user_id_str))
-            if user_obj:
-                embed.add_field(
-                    name=f"{displayed_count + 1}. Enemy of the People: {user_obj.display_name}",
-                    value=(f"🗣️ Caught in anti-Party agitation: **{user_data['count']}** time(s)\n"
-                           f"💸 Total fines: **{user_data['deducted_credits']}** Social Credits"),
-                    inline=False
-                )
-                displayed_count += 1
-        except disnake.NotFound: continue
-        except Exception as e: print(f"Error in naughty list: {e}"); continue
-    if displayed_count == 0:
-        embed.description = "No ideological subversives detected. Keep it up, Comrades!"
-        embed.color = EMBED_COLOR_SUCCESS
-    embed.set_footer(text="The Party sees all. Retribution is inevitable.")
-    await inter.followup.send(embed=embed)
+
+@bot.listen("on_button_click")
+async def on_leaderboard_button(inter: disnake.MessageInteraction):
+    # Page buttons carry the board, page size and target page, so they keep working after a restart.
+    if not inter.guild or not inter.component.custom_id.startswith(f"{LEADERBOARD_BUTTON_PREFIX}:"): return
+    _, board, page_size, number, _ = inter.component.custom_id.split(":")
+    if board not in LEADERBOARDS: return
+    await inter.response.defer()
+    page = await leaderboard_pages.get(inter.guild, board, int(page_size), max(int(number), 0))
+    await inter.edit_original_response(embed=page.embed, components=leaderboard_buttons(board, int(page_size), page))
 
 @admin_credits.error
 async def admin_credits_error(inter: disnake.ApplicationCommandInteraction, error):
@@ -470,8 +3234,34 @@ async def admin_credits_error(inter: disnake.ApplicationCommandInteraction, erro
 
 
 # --- Bot Startup ---
+def launch_shard_processes(shard_count: int, processes: int):
+    """Runs this script once per contiguous group of shards and waits for all of them to exit."""
+    groups = [range(shard_count)[i * shard_count // processes:(i + 1) * shard_count // processes] for i in range(processes)]
+    children = []
+    try:
+        for group in filter(None, groups):
+            children.append(subprocess.Popen([sys.executable, os.path.abspath(__file__), "--shard-count", str(shard_count),
+                                              "--shard-ids", ",".join(map(str, group))]))
+            print(f"Started shard process {children[-1].pid} for shard(s) {group.start}-{group.stop - 1} of {shard_count}")
+            if len(children) < processes: time.sleep(SHARD_LAUNCH_DELAY_SECONDS * len(group))
+        for child in children: child.wait()
+    except KeyboardInterrupt:
+        for child in children: child.terminate()
+        for child in children: child.wait()
+
 if __name__ == "__main__":
-    if BOT_TOKEN == "YOUR_BOT_TOKEN_HERE":
+    if "--migrate-json" in sys.argv:
+        migrate_json_to_sqlite()
+    elif BOT_TOKEN == "YOUR_BOT_TOKEN_HERE":
         print("!!! ATTENTION, COMRADE: PROVIDE THE BOT'S SECRET KEY (BOT_TOKEN) !!!")
+    elif ((STORAGE_BACKEND == "sqlite" or SHARD_IDS is not None or _cli_option("--launch-shards"))
+          and json_data_exists() and not sqlite_has_data()):
+        # Starting on the empty database would silently reset every balance (and rank role) to the default.
+        sys.exit(f"Cannot start: this setup uses the SQLite database, but {SQLITE_DB_FILE} is empty while JSON credit data "
+                 "exists. Run `python social_credit_bot.py --migrate-json` first.")
+    elif _cli_option("--launch-shards"):
+        launch_shard_processes(int(_cli_option("--launch-shards")), int(_cli_option("--processes") or 1))
     else:
+        try: store.claim()
+        except RuntimeError as e: sys.exit(f"Cannot start: {e}")
         bot.run(BOT_TOKEN)
@@ -0,0 +1,9 @@
+"""Shared setup for the test suite. Run from the repository root with `python -m pytest tests`."""
+import os
+import sys
+import tempfile
+
+# The bot creates its data files in the working directory on import, so keep them out of the repo.
+# Done here, before pytest imports any test module (and with it the bot).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="sc_tests_"))
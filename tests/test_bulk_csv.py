@@ -0,0 +1,36 @@
+"""Tests for the bulk credit CSV import and export. Run from the repository root with `python -m pytest tests`."""
+import asyncio
+import io
+
+import social_credit_bot as scb
+
+
+def parse(text: str):
+    return asyncio.run(scb.parse_credit_csv(text.encode("utf-8")))
+
+
+def test_parse_keeps_valid_rows_and_skips_a_header():
+    assert parse("﻿user_id,credits\n10,500\n11,-20\n") == ([(10, 500), (11, -20)], 1, [])
+
+
+def test_parse_skips_malformed_rows_and_non_ids():
+    rows, skipped, rejected = parse("10\nabc,5\n11,1.5\n0,5\n-3,5\n9223372036854775808,5\n12,7\n")
+    assert rows == [(12, 7)]
+    assert skipped == 6 and rejected == []
+
+
+def test_parse_rejects_out_of_range_amounts_by_line():
+    limit = scb.BULK_IMPORT_MAX_AMOUNT
+    rows, skipped, rejected = parse(f"10,{limit}\n11,{limit + 1}\n12,-{limit}\n13,-{limit + 1}\n")
+    assert rows == [(10, limit), (12, -limit)]
+    assert skipped == 0 and rejected == [2, 4]
+
+
+def test_export_round_trips_through_parse(tmp_path, monkeypatch):
+    store = scb.JsonCreditStore(str(tmp_path / "data"))
+    store.update_credits_bulk(1, [(10, 500), (11, -20)], add=False)
+    monkeypatch.setattr(scb, "store", store)
+    fp = io.BytesIO()
+    assert asyncio.run(scb.write_credit_csv(1, fp)) == 2
+    assert parse(fp.getvalue().decode("utf-8")) == (list(store.iter_credits(1)), 1, [])
+    store._partitions[1].close()
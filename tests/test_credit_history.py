@@ -0,0 +1,65 @@
+"""Tests for the per-server credit history files. Run from the repository root with `python -m pytest tests`."""
+import social_credit_bot as scb
+
+
+def test_history_survives_eviction_log_and_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(scb, "HISTORY_CACHE_MAX_GUILDS", 1)
+    monkeypatch.setattr(scb, "HISTORY_COMPACT_MIN_BYTES", 0)
+    history = scb.CreditHistory(str(tmp_path))
+    history.record(1, 10, 1000, 1100)
+    assert history.get(1, 10).points()[1] == [1000, 1100] # Loaded with the records still pending
+    history.record(2, 20, 1000, 900)
+    assert history.get(2, 20).points()[1] == [1000, 900] # Unloads server 1 while its records are still pending
+    assert list(history._guilds) == [2]
+    history.flush_sync()
+    assert history.get(1, 10).points()[1] == [1000, 1100] # Reloaded from its log
+    history.record(1, 10, 1100, 1200)
+    history.flush_sync() # Log now larger than the base: compacted into the next generation
+
+    reopened = scb.CreditHistory(str(tmp_path))
+    assert reopened.get(1, 10).points()[1] == [1000, 1100, 1200]
+    assert reopened.get(2, 20).points()[1] == [1000, 900]
+
+
+def test_record_failure_does_not_propagate(tmp_path, monkeypatch):
+    history = scb.CreditHistory(str(tmp_path))
+    monkeypatch.setattr(history, "_pending", None)
+    history.record(1, 10, 1000, 1100)
+
+
+def test_record_queues_changes_without_loading_the_server(tmp_path):
+    history = scb.CreditHistory(str(tmp_path))
+    history.record(1, 10, 1000, 1100)
+    history.flush_sync()
+    history.record(1, 10, 1100, 1200) # Its starting balance is written again, and dropped on load
+    history.record(1, 10, 1200, 1300)
+    history.record(1, 11, 500, 400)
+    assert not history._guilds
+    history.flush_sync()
+    assert history.get(1, 10).points()[1] == [1000, 1100, 1200, 1300]
+    assert history.get(1, 11).points()[1] == [500, 400]
+
+
+def test_user_history_downsamples_old_changes():
+    day = 86400; start = 1_000_000 * day # Midnight, so buckets line up with the samples
+    history = scb.UserHistory()
+    for i in range(scb.HISTORY_RAW_MAX_SAMPLES + 100): history.add(start + i, i)
+    # Past the sample cap the oldest changes are folded into an hourly (start, close, low, high, count) bucket.
+    assert len(history.raw) == 2 * scb.HISTORY_RAW_MAX_SAMPLES
+    assert list(history.hourly) == [start, 99, 0, 99, 100]
+    assert history.change_count() == scb.HISTORY_RAW_MAX_SAMPLES + 100
+
+    history.add(start + 3 * day, -5) # Older than HISTORY_RAW_SECONDS: every earlier sample joins the bucket
+    assert list(history.raw) == [start + 3 * day, -5]
+    assert list(history.hourly) == [start, scb.HISTORY_RAW_MAX_SAMPLES + 99, 0, scb.HISTORY_RAW_MAX_SAMPLES + 99, 300]
+
+    history.add(start + 20 * day, 7) # Older than HISTORY_HOURLY_SECONDS: hourly buckets merge into daily ones
+    top = scb.HISTORY_RAW_MAX_SAMPLES + 99
+    assert list(history.daily) == [start, top, 0, top, 300, start + 3 * day, -5, -5, -5, 1]
+    assert not history.hourly
+    assert history.points() == ([start + day, start + 4 * day, start + 20 * day], [top, -5, 7]) # Buckets close at their end
+    assert history.change_count() == 302
+
+    history.add(start + 400 * day, 9) # Older than HISTORY_DAILY_SECONDS: dropped
+    assert not history.daily and not history.hourly
+    assert history.first_recorded() == start + 400 * day and history.change_count() == 1
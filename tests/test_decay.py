@@ -0,0 +1,53 @@
+"""Tests for the credit decay sweep. Run from the repository root with `python -m pytest tests`."""
+from array import array
+
+import pytest
+
+import social_credit_bot as scb
+
+DAILY_RATE = 0.02
+DISTANCES = [100, 1000, 37, -100, -1000]
+
+
+def test_hourly_sweeps_decay_at_the_configured_daily_rate(tmp_path):
+    stores = [scb.JsonCreditStore(str(tmp_path / "data")), scb.SqliteCreditStore(str(tmp_path / "credits.db"))]
+    hourly = (1 - DAILY_RATE) ** (1 / 24)
+    for store in stores:
+        store.update_credits_bulk(1, [(user_id, scb.DEFAULT_CREDITS + d) for user_id, d in enumerate(DISTANCES)], add=False)
+        for _ in range(24): store.decay_credits(1, hourly, 0)
+
+    for user_id, distance in enumerate(DISTANCES):
+        balances = [store.get_credits(1, user_id) for store in stores]
+        assert balances[0] == balances[1] # Both backends run the same arithmetic
+        assert abs((balances[0] - scb.DEFAULT_CREDITS) - distance * (1 - DAILY_RATE)) < 1
+
+    # The carried fractions survive a reload, so the JSON store replays its sweeps to the same balances.
+    stores[0]._partitions[1].close()
+    reopened = scb.JsonCreditStore(str(tmp_path / "data"))
+    assert [reopened.get_credits(1, user_id) for user_id in range(len(DISTANCES))] == \
+           [stores[0].get_credits(1, user_id) for user_id in range(len(DISTANCES))]
+    reopened._partitions[1].close()
+
+
+def column(*distances):
+    return array("q", [scb.DEFAULT_CREDITS + d for d in distances])
+
+
+def test_decay_column_moves_balances_toward_the_default():
+    values, carries = scb.decay_column(column(100, -100, 0), 0.5, 0, array("d", [0.0] * 3))
+    assert list(values) == list(column(50, -50, 0))
+    assert list(carries) == [0.0, 0.0, 0.0]
+
+
+def test_decay_column_carries_fractions_to_the_next_sweep():
+    values, carries = scb.decay_column(column(3, -3), 0.9, 0, array("d", [0.0, 0.0]))
+    assert list(values) == list(column(2, -2)) # 2.7 and -2.7, truncated toward the default...
+    assert carries[0] == pytest.approx(0.7) and carries[1] == pytest.approx(-0.7) # ...with the rest carried
+    values, carries = scb.decay_column(values, 0.9, 0, carries)
+    assert list(values) == list(column(2, -2)) # 1.8 + 0.7 and -1.8 - 0.7
+
+
+def test_decay_column_regenerates_without_passing_the_default():
+    values, carries = scb.decay_column(column(-100, -3, 100), 1.0, 5, array("d", [0.0, -0.5, 0.0]))
+    assert list(values) == list(column(-95, 0, 100)) # Regeneration only lifts balances below the default
+    assert carries[1] == 0.0 # Reached the default, nothing left to carry
@@ -0,0 +1,66 @@
+"""Tests for forbidden word normalization and matching. Run from the repository root with `python -m pytest tests`."""
+import random
+import re
+import string
+
+import pytest
+
+import social_credit_bot as scb
+
+TRAPS = ["ass", "butt", "poop", "good", "bad word"]
+
+
+def random_word(rng: random.Random, min_len: int = 4, max_len: int = 10) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(min_len, max_len)))
+
+
+def naive_matcher(terms):
+    """One regex per normalized term, run over normalized text; a run of n letters matches n or more."""
+    patterns = []
+    for term in {scb.normalize_text(t).strip() for t in terms} - {""}:
+        body = "".join(re.escape(m.group(1)) + "{%d,}" % len(m.group()) for m in re.finditer(r"(.)\1*", term))
+        patterns.append(re.compile(r"(?:^|(?<= ))" + body + r"(?= |$)"))
+    def matches(text: str) -> bool:
+        normalized = scb.normalize_text(text)
+        return any(p.search(normalized) for p in patterns)
+    return matches
+
+
+def stretch(rng: random.Random, word: str) -> str:
+    return "".join(c * rng.choice((1, 1, 1, 2, 3)) for c in word)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("b4d  wörd", "bad word"), # Leetspeak, accents and a run of separators
+    ("bа​d", "bad"), # Cyrillic "а" and a zero-width space
+    ("з", "e"), # Homoglyph of 3, then leetspeak
+    ("baaad!!word", "baaad word"), # Repeated letters are kept for the automaton
+])
+def test_normalize_text(text, expected):
+    assert scb.normalize_text(text) == expected
+
+
+@pytest.mark.parametrize("text, found", [
+    ("you are a baaad wooord", "baaad wooord"),
+    ("B4D   w0rd", "B4D   w0rd"),
+    ("class bass as", None), # Whole words only, and a forbidden "ass" never matches "as"
+    ("pop goes the god", None),
+    ("what a poooop", "poooop"),
+])
+def test_automaton_finds_the_offending_text(text, found):
+    assert scb.WordAutomaton(TRAPS).find(text) == found
+
+
+def test_automaton_agrees_with_naive_matcher():
+    rng = random.Random(1234)
+    vocabulary = [random_word(rng, 2, 9) for _ in range(2000)]
+    terms = TRAPS + [random_word(rng) for _ in range(200)]
+    messages = ["as", "but", "pop", "god", "class", "bass", "asss", "buttt", "poooop", "goood", "baaad wooord", "bad wrd"]
+    for _ in range(300):
+        words = [rng.choice(vocabulary) for _ in range(rng.randint(3, 30))]
+        if rng.random() < 0.2: words.insert(rng.randrange(len(words) + 1), rng.choice(terms))
+        messages.append(" ".join(words))
+    messages += [" ".join(stretch(rng, w) for w in m.split()) for m in messages]
+    automaton = scb.WordAutomaton(terms); naive = naive_matcher(terms)
+    mismatches = [m for m in messages if bool(automaton.search(scb.normalize_text(m))) != naive(m)]
+    assert not mismatches
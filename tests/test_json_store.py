@@ -0,0 +1,97 @@
+"""Regression tests for the per-server JSON credit store. Run from the repository root with `python -m pytest tests`."""
+import asyncio
+import os
+
+import pytest
+
+import social_credit_bot as scb
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(scb, "JSON_CACHE_MAX_GUILDS", 1)
+    json_store = scb.JsonCreditStore(str(tmp_path / "data"))
+    yield json_store
+    for partition in json_store._partitions.values(): partition.close()
+
+
+def failing_snapshot(*args, **kwargs):
+    raise OSError("disk full")
+
+
+def test_failed_snapshot_survives_eviction_and_reload(store, monkeypatch):
+    store.update_credits(1, 10, 1000, add=False)
+    store.flush_sync()
+    store.update_credits(1, 10, 500)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(scb, "save_snapshot", failing_snapshot)
+        with pytest.raises(OSError): store.flush_sync()
+
+    store.get_credits(2, 20) # Evicts server 1, whose changes now only live in a rotated segment
+    assert 1 not in store._partitions
+    assert store.get_credits(1, 10) == 1500
+
+    # A later successful snapshot must include the segment's changes before retiring it.
+    store.update_credits(1, 10, 1)
+    store.flush_sync()
+    store.get_credits(2, 20)
+    assert store.get_credits(1, 10) == 1501
+
+
+def test_failed_async_snapshot_is_retried(store, monkeypatch):
+    async def run():
+        store.start()
+        store.update_credits(1, 10, 1500, add=False)
+        with monkeypatch.context() as patch:
+            patch.setattr(scb, "save_snapshot", failing_snapshot)
+            await store.flush()
+        assert store._partitions[1].pending # Still owed a snapshot
+        store.get_credits(2, 20)
+        await store.close()
+
+    asyncio.run(run())
+    reopened = scb.JsonCreditStore(store.directory)
+    assert reopened.get_credits(1, 10) == 1500
+
+
+def test_unappliable_journal_record_is_quarantined(store):
+    store.update_credits(1, 10, 10 ** 20, add=False) # Too large for the decay sweep's int64 columns
+    store.update_credits(1, 11, 500, add=False)
+    with pytest.raises(OverflowError): store.decay_credits(1, 0.5, 0)
+    store._partitions[1].journal.write('{"s":99,"t":0,"op":"decay","g":1,"f":0.5,"n":0}\n') # As journaled before the fix
+    store._partitions[1].close()
+
+    reopened = scb.JsonCreditStore(store.directory)
+    assert reopened.get_credits(1, 11) == 500
+    assert os.path.exists(os.path.join(store.directory, "1.quarantine.jsonl"))
+    reopened.flush_sync()
+    reopened._partitions[1].close()
+    assert scb.JsonCreditStore(store.directory).get_credits(1, 11) == 500
+
+
+def test_decay_sweeps_keep_evicted_journals_bounded(store):
+    async def settle():
+        for _ in range(1000):
+            await asyncio.sleep(0)
+            if not store._compact_needed.is_set() and not store._io_lock.locked(): return
+
+    async def run():
+        store.start()
+        for guild_id in (1, 2, 3): store.update_credits(guild_id, 10, 5000, add=False)
+        for _ in range(20): # More sweeps than SNAPSHOT_JOURNAL_THRESHOLD would ever let pile up, all over budget
+            for guild_id in (1, 2, 3):
+                store.decay_credits(guild_id, 0.99, 0)
+                await settle()
+        await settle()
+        for guild_id in (1, 2, 3):
+            journals = [name for name in os.listdir(store.directory) if name.startswith(f"{guild_id}.journal.jsonl")]
+            records = 0
+            for name in journals:
+                with open(os.path.join(store.directory, name)) as f: records += len(f.readlines())
+            assert records <= 2
+        assert not store._leftover_segments
+        await store.close()
+
+    asyncio.run(run())
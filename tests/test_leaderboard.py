@@ -0,0 +1,41 @@
+"""Tests for the leaderboard page cache. Run from the repository root with `python -m pytest tests`."""
+import pytest
+
+import social_credit_bot as scb
+
+
+def cached(pages: scb.LeaderboardPages, guild_id: int, board: str, page_size: int, lowest_scores: list):
+    built = [scb.LeaderboardPage(number, (number + 1) * page_size, [], lowest, number < len(lowest_scores) - 1, None)
+             for number, lowest in enumerate(lowest_scores)]
+    pages._pages.setdefault((guild_id, board), {})[page_size] = built
+    return built
+
+
+@pytest.mark.parametrize("score, kept", [
+    (50, 2), # Below every page, but the last page is always dropped
+    (500, 1), # Ties with page 1's lowest score, so page 1 and every later page go
+    (600, 1),
+    (10 ** 6, 0),
+    (None, 0), # Drops the whole board
+])
+def test_invalidate_drops_pages_a_score_could_move(score, kept):
+    pages = scb.LeaderboardPages()
+    built = cached(pages, 1, "credits", 10, [900, 500, 100])
+    pages.invalidate(1, "credits", score)
+    assert pages._pages[(1, "credits")][10] == built[:kept]
+
+
+def test_invalidate_only_touches_its_own_board():
+    pages = scb.LeaderboardPages()
+    cached(pages, 1, "credits", 10, [900, 500, 100]); cached(pages, 1, "credits", 25, [400, 50])
+    other_board = cached(pages, 1, "violators", 10, [5, 1]); other_guild = cached(pages, 2, "credits", 10, [900, 500, 100])
+    pages.invalidate(1, "credits", 500)
+    assert len(pages._pages[(1, "credits")][10]) == 1 and len(pages._pages[(1, "credits")][25]) == 0
+    assert pages._pages[(1, "violators")][10] == other_board and pages._pages[(2, "credits")][10] == other_guild
+
+
+def test_invalidate_drops_pages_without_a_lowest_score():
+    pages = scb.LeaderboardPages()
+    built = cached(pages, 1, "credits", 10, [900, None, 100])
+    pages.invalidate(1, "credits", 50)
+    assert pages._pages[(1, "credits")][10] == built[:1]
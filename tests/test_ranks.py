@@ -0,0 +1,32 @@
+"""Tests for rank ladders. Run from the repository root with `python -m pytest tests`."""
+import pytest
+
+import social_credit_bot as scb
+
+LADDER = scb.RankTable([
+    (0, "Citizen", "👤", "Citizen"),
+    (-float("inf"), "Outcast", "🚫", "Outcast"),
+    (1000, "Hero", "🌟", None),
+])
+
+
+@pytest.mark.parametrize("credits_val, expected", [
+    (-10 ** 9, ("🚫 Outcast", "Outcast", "Outcast")),
+    (-1, ("🚫 Outcast", "Outcast", "Outcast")),
+    (0, ("👤 Citizen", "Citizen", "Citizen")), # A threshold belongs to the rank it starts
+    (999, ("👤 Citizen", "Citizen", "Citizen")),
+    (1000, ("🌟 Hero", "Hero", None)),
+])
+def test_info_picks_the_highest_threshold_reached(credits_val, expected):
+    assert LADDER.info(credits_val) == expected
+
+
+def test_credits_below_the_lowest_threshold_get_the_lowest_rank():
+    ladder = scb.RankTable([(100, "Member", "👤", "Member"), (500, "Elder", "🌟", "Elder")])
+    assert ladder.info(-5)[1] == "Member"
+
+
+def test_json_round_trip_keeps_the_open_bottom():
+    reloaded = scb.RankTable.from_json(LADDER.to_json())
+    assert reloaded.ranks == LADDER.ranks
+    assert reloaded.role_names == {"Citizen", "Outcast"}
@@ -0,0 +1,25 @@
+"""Tests for the SQLite credit store. Run from the repository root with `python -m pytest tests`."""
+import random
+
+import social_credit_bot as scb
+
+
+def brute_force_rank(store, guild_id, user_id):
+    balances = dict(store.iter_credits(guild_id))
+    if user_id not in balances: return None, len(balances)
+    return sum(credits_val > balances[user_id] for credits_val in balances.values()) + 1, len(balances)
+
+
+def test_credit_rank_index_follows_every_kind_of_write(tmp_path):
+    store = scb.SqliteCreditStore(str(tmp_path / "credits.db"))
+    rng = random.Random(7)
+    store.credit_rank(1, 0) # Build the index first, so every later write has to keep it current
+    for step in range(600):
+        user_id = rng.randrange(60)
+        kind = rng.random()
+        if kind < 0.5: store.update_credits(1, user_id, rng.randrange(-300, 301))
+        elif kind < 0.8: store.update_credits(1, user_id, rng.randrange(-2000, 3000), add=False)
+        elif kind < 0.97: store.update_credits_bulk(1, [(rng.randrange(60), rng.randrange(-50, 51)) for _ in range(5)])
+        else: store.decay_credits(1, 0.9, 20)
+        probe = rng.randrange(70)
+        assert store.credit_rank(1, probe) == brute_force_rank(store, 1, probe), step